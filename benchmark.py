@@ -0,0 +1,460 @@
+"""
+A fixed benchmark corpus for every puzzle type, and a runner that times
+each solver on it.
+
+The corpus is generated from a seed, so every run with the same seed
+solves the same puzzles: MNPuzzle scrambles of known depth, sudoku from
+easy up to 17 clues, word ladders between words of the words file, and
+peg solitaire boards.  Results are written as JSON, and may be compared
+with those of an earlier run to flag regressions:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+
+Each set of puzzles is solved by each of its solvers in a freshly
+spawned process, and the peak memory reported, on unix platforms, is
+how far that process's peak grew while solving, so that it belongs to
+that solver alone.  Solves run without a time limit unless --timeout gives
+one, since enforcing it costs a little time on every puzzle expanded.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    # peak memory is only reported where resource is available
+    resource = None
+from grid_peg_solitaire_puzzle import GridPegSolitairePuzzle
+from mn_puzzle import MNPuzzle
+from puzzle_tools import SOLVERS, Budget, BudgetExceeded, SearchStats
+from sudoku_puzzle import SudokuPuzzle, DancingLinksSolver
+from word_ladder_puzzle import WordLadderPuzzle
+
+# strategies the corpus may name, beyond those of solve_many
+BENCHMARK_SOLVERS = dict(SOLVERS, dancing_links=DancingLinksSolver)
+
+# sudoku from the examples in sudoku_puzzle, then two 17-clue puzzles,
+# the fewest clues a sudoku with one solution can have
+EASY_SUDOKU = [
+    "***7*8*1***7*9***69*31*****35*8**6*1*********1*6**9*48"
+    "*****12*78***7*4***6*3*2***",
+    "***9*2****91***63**3**7**8*3*******8**9***2**5*******7"
+    "*7**8**4**45***81****3*6***",
+    "56***7**9*7**48*31*********43********8*****9********26"
+    "*********19*36**7*7**1***42"]
+HARD_SUDOKU = [
+    "*******1*4*********2***********5*4*7**8***3****1*9****"
+    "3**4**2***5*1********8*6***",
+    "*******12****35******6***7*7*****3*****4**8**1********"
+    "***12*****8*****4**5****6**"]
+
+PEG_BOARDS = {
+    "peg-5x5": ["*****", "*****", "*****", "**.**", "*****"],
+    "peg-english": ["##***##", "##***##", "*******", "***.***",
+                    "*******", "##***##", "##***##"]}
+
+
+def build_corpus(seed=0):
+    """
+    Return the benchmark corpus for seed, as a list of (name, puzzles,
+    solvers) for each set of puzzles, where solvers are the keys of
+    BENCHMARK_SOLVERS to run on that set.
+
+    @type seed: int
+    @rtype: list[(str, list[Puzzle], list[str])]
+    """
+    rng = random.Random(seed)
+    corpus = []
+    goal = (("1", "2", "3"), ("4", "5", "6"), ("7", "8", "*"))
+    for depth, puzzles in sorted(mn_layers(goal, (8, 14, 20), 5,
+                                           rng).items()):
+        corpus.append(("mn-3x3-depth{}".format(depth), puzzles,
+                       ["breadth_first", "bidirectional", "astar",
+                        "ida_star"]))
+    goal = tuple(tuple(row) for row in ("1234", "5678", "9ABC", "DEF*"))
+    for moves in (30, 60):
+        corpus.append(("mn-4x4-walk{}".format(moves),
+                       [mn_scramble(goal, moves, rng) for _ in range(3)],
+                       ["astar", "ida_star"]))
+    symbols = set("123456789")
+    for name, grids in (("sudoku-easy", EASY_SUDOKU),
+                        ("sudoku-17", HARD_SUDOKU)):
+        corpus.append((name, [SudokuPuzzle(9, list(grid), symbols)
+                              for grid in grids],
+                       ["depth_first", "dancing_links"]))
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "words"), encoding="UTF-8") as f:
+        ws = set(f.read().split())
+    for length in (4, 5):
+        corpus.append(("words-{}".format(length),
+                       [word_ladder(ws, length, 12, rng)
+                        for _ in range(5)],
+                       ["breadth_first", "bidirectional"]))
+    for name, rows in sorted(PEG_BOARDS.items()):
+        corpus.append((name, [GridPegSolitairePuzzle(
+            [list(row) for row in rows], {"*", ".", "#"})],
+                       ["depth_first"]))
+    return corpus
+
+
+def mn_layers(goal, depths, size, rng):
+    """
+    Return, for each of depths, size MNPuzzles towards goal whose
+    shortest solutions take exactly that many moves, found by
+    breadth-first search back from goal.
+
+    @type goal: tuple[tuple[str]]
+    @type depths: iterable[int]
+    @type size: int
+    @type rng: random.Random
+    @rtype: dict[int, list[MNPuzzle]]
+    """
+    wanted, found = set(depths), {}
+    level, seen = [MNPuzzle(goal, goal)], set()
+    seen.add(level[0].state_key())
+    for depth in range(max(wanted) + 1):
+        if depth in wanted:
+            # sort first, so the sample depends on rng alone
+            grids = sorted([p.from_grid for p in level])
+            found[depth] = [MNPuzzle(grid, goal)
+                            for grid in rng.sample(grids,
+                                                   min(size, len(grids)))]
+        next_level = []
+        for puzzle in level:
+            for child in puzzle.extensions():
+                if child.state_key() not in seen:
+                    seen.add(child.state_key())
+                    next_level.append(child)
+        level = next_level
+    return found
+
+
+def mn_scramble(goal, moves, rng):
+    """
+    Return an MNPuzzle towards goal made by moves random moves from
+    goal, never undoing the move before, so its shortest solution takes
+    at most moves moves.
+
+    @type goal: tuple[tuple[str]]
+    @type moves: int
+    @type rng: random.Random
+    @rtype: MNPuzzle
+    """
+    puzzle, previous = MNPuzzle(goal, goal), None
+    for _ in range(moves):
+        children = [child for child in puzzle.extensions()
+                    if child.state_key() != previous]
+        previous = puzzle.state_key()
+        puzzle = rng.choice(children)
+    return MNPuzzle(puzzle.from_grid, goal)
+
+
+def word_ladder(ws, length, steps, rng):
+    """
+    Return a WordLadderPuzzle over ws between two lowercase words of
+    length length, the second found by a random walk of at most steps
+    changes from the first, so that a ladder between them exists.
+
+    @type ws: set[str]
+    @type length: int
+    @type steps: int
+    @type rng: random.Random
+    @rtype: WordLadderPuzzle
+    """
+    words = sorted([w for w in ws if len(w) == length and w.isalpha() and
+                    w.islower()])
+    while True:
+        start = rng.choice(words)
+        puzzle, visited = WordLadderPuzzle(start, "", ws), {start}
+        for _ in range(steps):
+            children = [child for child in puzzle.extensions()
+                        if child.state_key() not in visited]
+            if not children:
+                break
+            puzzle = rng.choice(children)
+            visited.add(puzzle.state_key())
+        if len(visited) > 1:
+            return WordLadderPuzzle(start, puzzle.state_key(), ws)
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile of values, interpolating between the two
+    nearest ranks.
+
+    >>> percentile([4, 1, 3, 2], 50)
+    2.5
+    >>> percentile([1.0], 99)
+    1.0
+
+    @type values: list[float]
+    @type q: float
+    @rtype: float
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def run_set(puzzles, strategy, timeout=None):
+    """
+    Return the benchmark results of solving each of puzzles with the
+    solver named strategy, allowing timeout seconds per puzzle, or as
+    long as it takes if timeout is None.
+
+    @type puzzles: list[Puzzle]
+    @type strategy: str
+    @type timeout: float | None
+    @rtype: dict
+    """
+    solver = BENCHMARK_SOLVERS[strategy]()
+    _reset_peak_rss()
+    start_rss = _peak_rss()
+    counts = {"solved": 0, "unsolvable": 0, "timeout": 0, "error": 0}
+    latencies, nodes, seconds, moves = [], 0, 0.0, 0
+    for puzzle in puzzles:
+        stats = SearchStats(timed=False)
+        budget = None if timeout is None else Budget(seconds=timeout)
+        try:
+            node = solver.solve(puzzle, stats, budget)
+            status = "unsolvable" if node is None else "solved"
+        except BudgetExceeded:
+            node, status = None, "timeout"
+        except Exception:
+            node, status = None, "error"
+        counts[status] += 1
+        latencies.append(stats.seconds)
+        nodes += stats.expanded
+        seconds += stats.seconds
+        if node is not None:
+            moves += len(node.puzzles()) - 1
+    result = {"cases": len(puzzles)}
+    result.update(counts)
+    result.update({
+        "moves": moves,
+        "nodes": nodes,
+        "nodes_per_second": nodes / seconds if nodes and seconds else None,
+        "latency": {"p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p99": percentile(latencies, 99),
+                    "max": max(latencies)},
+        "peak_rss": (None if start_rss is None else
+                     _peak_rss() - start_rss)})
+    return result
+
+
+def _reset_peak_rss():
+    """
+    Make the peak memory of this process start again from its current
+    memory, where Linux allows it, since a spawned process otherwise
+    starts from the peak of the process that started it.
+
+    @rtype: None
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    """
+    Return the peak memory of this process so far, in kilobytes on
+    Linux and bytes on macOS, or None where it isn't available.
+
+    @rtype: int | None
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_set_in_child(connection, puzzles, strategy, timeout):
+    """
+    Send the results of run_set on puzzles, strategy and timeout
+    through connection, or a "failure" describing the error it raised.
+
+    @type connection: multiprocessing.connection.Connection
+    @type puzzles: list[Puzzle]
+    @type strategy: str
+    @type timeout: float | None
+    @rtype: None
+    """
+    try:
+        connection.send(run_set(puzzles, strategy, timeout))
+    except Exception as e:
+        connection.send({"failure": repr(e)})
+    finally:
+        connection.close()
+
+
+def run_benchmark(corpus, timeout=None, log=None):
+    """
+    Return the results of running every solver of corpus on its set, by
+    set name and then solver, each run in a process of its own.  A run
+    whose process fails has only a "failure" describing why.  If log is
+    not None, write a line to it as each run finishes.
+
+    @type corpus: list[(str, list[Puzzle], list[str])]
+    @type timeout: float | None
+    @type log: file | None
+    @rtype: dict[str, dict[str, dict]]
+    """
+    # a forked process would start from its parent's peak memory, which
+    # a spawned one doesn't share
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, puzzles, strategies in corpus:
+        results[name] = {}
+        for strategy in strategies:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run_set_in_child,
+                                      args=(sender, puzzles, strategy,
+                                            timeout))
+            process.start()
+            sender.close()
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = {"failure": "exit code {}".format(
+                    process.exitcode)}
+            process.join()
+            results[name][strategy] = result
+            if log is not None:
+                log.write("{} {}: {}\n".format(name, strategy,
+                                               _summary(result)))
+                log.flush()
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Return a description of each regression in results from baseline:
+    fewer puzzles solved, or nodes per second, median or 90th
+    percentile latency, or peak memory worse by more than a fraction
+    tolerance.  Sets and solvers missing from either are skipped.
+
+    >>> old = {"s": {"bfs": {"solved": 2, "nodes_per_second": 100.0,
+    ...                      "latency": {"p50": 1.0, "p90": 2.0},
+    ...                      "peak_rss": 1000}}}
+    >>> new = {"s": {"bfs": {"solved": 2, "nodes_per_second": 50.0,
+    ...                      "latency": {"p50": 1.1, "p90": 2.0},
+    ...                      "peak_rss": 1000}}}
+    >>> compare(new, old)
+    ['s bfs: nodes_per_second 100 -> 50']
+
+    @type results: dict[str, dict[str, dict]]
+    @type baseline: dict[str, dict[str, dict]]
+    @type tolerance: float
+    @rtype: list[str]
+    """
+    regressions = []
+    for name in sorted(set(results) & set(baseline)):
+        for strategy in sorted(set(results[name]) & set(baseline[name])):
+            new, old = results[name][strategy], baseline[name][strategy]
+            if "failure" in new or "failure" in old:
+                if "failure" not in old:
+                    regressions.append("{} {}: {}".format(
+                        name, strategy, new["failure"]))
+                continue
+            label = "{} {}: ".format(name, strategy)
+            if new["solved"] < old["solved"]:
+                regressions.append(label + "solved {} -> {}".format(
+                    old["solved"], new["solved"]))
+            checks = [("nodes_per_second", old["nodes_per_second"],
+                       new["nodes_per_second"], -1),
+                      ("latency p50", old["latency"]["p50"],
+                       new["latency"]["p50"], 1),
+                      ("latency p90", old["latency"]["p90"],
+                       new["latency"]["p90"], 1),
+                      ("peak_rss", old["peak_rss"], new["peak_rss"], 1)]
+            for field, before, after, worse in checks:
+                if before is None or after is None:
+                    continue
+                if (after - before) * worse > tolerance * before:
+                    regressions.append(label + "{} {:.4g} -> {:.4g}".format(
+                        field, before, after))
+    return regressions
+
+
+def _summary(result):
+    """
+    Return a one-line summary of the results of one benchmark run.
+
+    @type result: dict
+    @rtype: str
+    """
+    if "failure" in result:
+        return "failed: {}".format(result["failure"])
+    rate = result["nodes_per_second"]
+    return ("{solved}/{cases} solved, p50 {p50:.3f}s, max {max:.3f}s, "
+            "{rate} nodes/s".format(
+                solved=result["solved"], cases=result["cases"],
+                p50=result["latency"]["p50"], max=result["latency"]["max"],
+                rate="-" if rate is None else "{:.0f}".format(rate)))
+
+
+def main(argv=None):
+    """
+    Run the benchmark as the command line in argv asks, and return the
+    exit status: 1 if a baseline was given and results regressed from
+    it, otherwise 0.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed the corpus is generated from")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds allowed per puzzle, if limited")
+    parser.add_argument("--only", default="",
+                        help="run only sets whose names contain this")
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument("--baseline",
+                        help="compare with the JSON results saved here")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction by which results may be worse")
+    args = parser.parse_args(argv)
+    corpus = [entry for entry in build_corpus(args.seed)
+              if args.only in entry[0]]
+    report = {"meta": {"seed": args.seed, "timeout": args.timeout,
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "results": run_benchmark(corpus, args.timeout, sys.stderr)}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline["results"],
+                              args.tolerance)
+        for regression in regressions:
+            sys.stderr.write("regression: {}\n".format(regression))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
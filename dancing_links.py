@@ -0,0 +1,168 @@
+"""
+Knuth's Algorithm X for exact cover, over dancing links.
+
+Nodes of the sparse matrix live in parallel lists of integer links
+rather than in objects, which keeps covering and uncovering columns to
+a few list stores each.
+"""
+
+
+class ExactCover:
+    """
+    An exact cover problem: choose rows so that every column is covered
+    by exactly one chosen row.
+    """
+
+    def __init__(self, columns, rows):
+        """
+        Create a new ExactCover self with columns numbered 0 to
+        columns - 1, and rows[k] listing the columns that row k covers.
+
+        @type self: ExactCover
+        @type columns: int
+        @type rows: list[list[int]]
+        @rtype: None
+        """
+        # node 0 is the root, nodes 1..columns the column headers, and
+        # the rest one node per (row, column) entry
+        count = columns + 1 + sum([len(row) for row in rows])
+        self._left = [0] * count
+        self._right = [0] * count
+        self._up = list(range(count))
+        self._down = list(range(count))
+        self._column = list(range(count))
+        self._size = [0] * (columns + 1)
+        self._row = [-1] * count
+        for c in range(columns + 1):
+            self._left[c], self._right[c] = c - 1, c + 1
+        self._left[0], self._right[columns] = columns, 0
+        node = columns + 1
+        for k, row in enumerate(rows):
+            first = node
+            for c in row:
+                c += 1
+                self._column[node], self._row[node] = c, k
+                self._up[node], self._down[node] = self._up[c], c
+                self._down[self._up[c]] = node
+                self._up[c] = node
+                self._size[c] += 1
+                self._left[node], self._right[node] = node - 1, node + 1
+                node += 1
+            if row:
+                self._left[first], self._right[node - 1] = node - 1, first
+
+    def solutions(self, limit=None, check=None):
+        """
+        Yield each exact cover of ExactCover self as a list of row
+        numbers, stopping after limit covers unless limit is None.
+
+        The search always branches on the column with the fewest rows
+        left, and keeps its choices on an explicit stack.  If check is
+        not None, it is called before each column is chosen, and may
+        stop the search by raising.
+
+        >>> problem = ExactCover(3, [[0, 1], [2], [0], [1, 2]])
+        >>> sorted([sorted(rows) for rows in problem.solutions()])
+        [[0, 1], [2, 3]]
+
+        @type self: ExactCover
+        @type limit: int | None
+        @type check: () -> Any | None
+        @rtype: generator[list[int]]
+        """
+        # work on copies, so an abandoned generator leaves self intact
+        left, right = self._left[:], self._right[:]
+        up, down = self._up[:], self._down[:]
+        column, size, row_of = self._column, self._size[:], self._row
+
+        def cover(c):
+            right[left[c]], left[right[c]] = right[c], left[c]
+            i = down[c]
+            while i != c:
+                j = right[i]
+                while j != i:
+                    down[up[j]], up[down[j]] = down[j], up[j]
+                    size[column[j]] -= 1
+                    j = right[j]
+                i = down[i]
+
+        def uncover(c):
+            i = up[c]
+            while i != c:
+                j = left[i]
+                while j != i:
+                    size[column[j]] += 1
+                    down[up[j]] = up[down[j]] = j
+                    j = left[j]
+                i = up[i]
+            right[left[c]] = left[right[c]] = c
+
+        # chosen[d] is the row node picked at depth d
+        chosen, found = [], 0
+        while True:
+            backtrack = True
+            if right[0] == 0:
+                yield [row_of[r] for r in chosen]
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+            else:
+                if check is not None:
+                    check()
+                c, best = 0, None
+                j = right[0]
+                while j != 0:
+                    if best is None or size[j] < best:
+                        c, best = j, size[j]
+                        if best <= 1:
+                            break
+                    j = right[j]
+                if best > 0:
+                    cover(c)
+                    r = down[c]
+                    j = right[r]
+                    while j != r:
+                        cover(column[j])
+                        j = right[j]
+                    chosen.append(r)
+                    backtrack = False
+            while backtrack and chosen:
+                r = chosen.pop()
+                j = left[r]
+                while j != r:
+                    uncover(column[j])
+                    j = left[j]
+                c, r = column[r], down[r]
+                if r != c:
+                    # try the next row of the same column
+                    j = right[r]
+                    while j != r:
+                        cover(column[j])
+                        j = right[j]
+                    chosen.append(r)
+                    backtrack = False
+                else:
+                    uncover(c)
+            if backtrack:
+                return
+
+    def count(self, limit=None, check=None):
+        """
+        Return the number of exact covers of ExactCover self, counting
+        no further than limit unless limit is None, and calling check
+        as solutions does.
+
+        >>> ExactCover(2, [[0], [1], [0, 1]]).count()
+        2
+
+        @type self: ExactCover
+        @type limit: int | None
+        @type check: () -> Any | None
+        @rtype: int
+        """
+        return sum([1 for _ in self.solutions(limit, check)])
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
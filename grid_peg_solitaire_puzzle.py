@@ -22,7 +22,11 @@ class GridPegSolitairePuzzle(Puzzle):
         assert all([len(x) == len(marker[0]) for x in marker[1:]])
         assert all([all(x in marker_set for x in row) for row in marker])
         assert all([x == "*" or x == "." or x == "#" for x in marker_set])
-        self._marker, self._marker_set = marker, marker_set
+        cells = [x for row in marker for x in row]
+        self._board = peg_board(len(marker), len(marker[0]),
+                                _mask(cells, "#"))
+        # bit r * width + c is set iff there is a peg in row r, column c
+        self._pegs, self._marker_set = _mask(cells, "*"), marker_set
 
     def __eq__(self, other):
         """
@@ -33,23 +37,41 @@ class GridPegSolitairePuzzle(Puzzle):
         Return whether GridPegSolitairePuzzle self is equivalent to other.
         """
         return (type(other) == type(self) and
-                self._marker == other._marker and
+                self._pegs == other._pegs and
+                self._board.key == other._board.key and
                 self._marker_set == other._marker_set)
 
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return the pegs of GridPegSolitairePuzzle self as a bitboard,
+        taking the smallest over all rotations and reflections of the
+        board, since a position and its mirror images are solved alike.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: int
+        """
+        return self._board.canonical(self._pegs)
+
     def __str__(self):
         """
         Return a string representation.
 
         @rtype: str
         """
-        width = len(self._marker[0])
-        height = len(self._marker)
-
+        width, unused = self._board.width, self._board.unused
         string = ''
 
-        for row in self._marker:
-            for obj in row:
-                string += obj
+        for r in range(self._board.height):
+            for c in range(width):
+                bit = 1 << (r * width + c)
+                if unused & bit:
+                    string += '#'
+                elif self._pegs & bit:
+                    string += '*'
+                else:
+                    string += '.'
             string += '\n'
 
         return ("Current marker: \n{}".format(string.strip()))
@@ -59,53 +81,118 @@ class GridPegSolitairePuzzle(Puzzle):
 
     def extensions(self):
         """
-        Return list of extensions of SudokuPuzzle self.
+        Return list of extensions of GridPegSolitairePuzzle self.
 
         @type self: GridPegSolitairePuzzle
         @rtype: list[GridPegSolitairePuzzle]
         """
-        width = len(self._marker[0])
-        height = len(self._marker)
-        list_of_exten = []
-
-        list_coord = []
-        if len(self._marker) != 0:
-            for n in range(height):
-                if '.' in self._marker[n]:
-                    row = n
-                    col = self._marker[n].index('.')
-                    list_coord.append((row, col))
-
-        for coord in list_coord:
-            x = coord[0]
-            y = coord[1]
-
-            # check top
-            if x - 2 >= 0:
-                if self._marker[x-2][y] == '*' and self._marker[x-1][y] == '*':
-                    new_board = make_top_board(self._marker, x, y)
-                    copy = GridPegSolitairePuzzle(new_board, self._marker_set)
-                    list_of_exten.append(copy)
-            # check right
-            if y + 2 < width:
-                if self._marker[x][y+2] == '*' and self._marker[x][y+1] == '*':
-                    new_board = make_right_board(self._marker, x, y)
-                    copy = GridPegSolitairePuzzle(new_board, self._marker_set)
-                    list_of_exten.append(copy)
-            # check bottom
-            if x + 2 < height:
-                if self._marker[x + 2][y] == '*' and self._marker[x + 1][y] == '*':
-                    new_board = make_bottom_board(self._marker, x, y)
-                    copy = GridPegSolitairePuzzle(new_board, self._marker_set)
-                    list_of_exten.append(copy)
-            # check left
-            if y - 2 >= 0:
-                if self._marker[x][y-2] == '*' and self._marker[x][y-1] == '*':
-                    new_board = make_left_board(self._marker, x, y)
-                    copy = GridPegSolitairePuzzle(new_board, self._marker_set)
-                    list_of_exten.append(copy)
-
-        return list_of_exten
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of GridPegSolitairePuzzle self one jump at a
+        time.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: generator[GridPegSolitairePuzzle]
+        """
+        pegs = self._pegs
+        for jumpers, landing, flip in self._board.jumps:
+            if pegs & jumpers == jumpers and not pegs & landing:
+                yield self._extend(pegs ^ flip)
+
+    def move_to(self, extension):
+        """
+        Return the (row, column) cells that a peg jumps from and to in
+        GridPegSolitairePuzzle self to reach extension.
+
+        >>> p = GridPegSolitairePuzzle([["*", "*", "."]], {"*", "."})
+        >>> p.move_to(p.extensions()[0])
+        ((0, 0), (0, 2))
+
+        @type self: GridPegSolitairePuzzle
+        @type extension: GridPegSolitairePuzzle
+        @rtype: ((int, int), (int, int))
+        """
+        width = self._board.width
+        gone = self._pegs & ~extension._pegs
+        landing = (extension._pegs & ~self._pegs).bit_length() - 1
+        low = (gone & -gone).bit_length() - 1
+        high = gone.bit_length() - 1
+        # the jumped-over cell lies halfway between the other two
+        start = low if 2 * high == low + landing else high
+        return divmod(start, width), divmod(landing, width)
+
+    def moves(self):
+        """
+        Return the jumps that can be made in GridPegSolitairePuzzle self,
+        each as the bitmask of the three cells whose pegs it toggles.
+
+        >>> GridPegSolitairePuzzle([["*", "*", "."]], {"*", "."}).moves()
+        [7]
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: list[int]
+        """
+        pegs = self._pegs
+        return [flip for jumpers, landing, flip in self._board.jumps
+                if pegs & jumpers == jumpers and not pegs & landing]
+
+    def apply(self, move):
+        """
+        Make the jump move in GridPegSolitairePuzzle self.
+
+        @type self: GridPegSolitairePuzzle
+        @type move: int
+        @rtype: None
+        """
+        self._pegs ^= move
+
+    def undo(self, move):
+        """
+        Take back the jump move in GridPegSolitairePuzzle self.
+
+        @type self: GridPegSolitairePuzzle
+        @type move: int
+        @rtype: None
+        """
+        self._pegs ^= move
+
+    def copy(self):
+        """
+        Return a copy of GridPegSolitairePuzzle self.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: GridPegSolitairePuzzle
+        """
+        return self._extend(self._pegs)
+
+    def pack_state(self):
+        """
+        Return the state key of GridPegSolitairePuzzle self as big-endian
+        bytes, one bit per cell of the board.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: bytes
+        """
+        board = self._board
+        return self.state_key().to_bytes(
+            (board.height * board.width + 7) // 8, "big")
+
+    def unpack_state(self, data):
+        """
+        Return a GridPegSolitairePuzzle on the same board as self with
+        the pegs packed into data by pack_state.
+
+        >>> p = GridPegSolitairePuzzle([["*", "*", "."]], {"*", "."})
+        >>> p.unpack_state(p.pack_state()).state_key() == p.state_key()
+        True
+
+        @type self: GridPegSolitairePuzzle
+        @type data: bytes
+        @rtype: GridPegSolitairePuzzle
+        """
+        return self._extend(int.from_bytes(data, "big"))
 
     # A configuration is solved when there is exactly one "*" left
     def is_solved(self):
@@ -115,158 +202,190 @@ class GridPegSolitairePuzzle(Puzzle):
         @type self: GridPegSolitairePuzzle
         @rtype: bool
         """
-        counter = 0
-        if not self._marker is None:
-            for row in self._marker:
-                for char in row:
-                    if char == "*":
-                        counter += 1
+        return self._pegs != 0 and self._pegs & (self._pegs - 1) == 0
+
+    def _extend(self, pegs):
+        # Return a GridPegSolitairePuzzle on the same board as self with
+        # pegs pegs.
+        #
+        # @type self: GridPegSolitairePuzzle
+        # @type pegs: int
+        # @rtype: GridPegSolitairePuzzle
+        child = GridPegSolitairePuzzle.__new__(GridPegSolitairePuzzle)
+        child._board, child._marker_set = self._board, self._marker_set
+        child._pegs = pegs
+        return child
+
+
+class PegBoard:
+    """
+    The shape of a peg solitaire grid, with every jump that can be made
+    on it, and every rotation or reflection that maps it onto itself,
+    worked out in advance.
+    """
 
-        return counter == 1
+    def __init__(self, height, width, unused):
+        """
+        Create a new PegBoard self of height rows and width columns,
+        where bit r * width + c of unused is set iff the cell in row r,
+        column c is unused.
+
+        Each jump is stored as (jumpers, landing, flip): the bitmask of
+        the jumping and jumped-over cells that must hold pegs, the bit
+        of the cell that must be empty, and the bitmask of all three
+        cells, whose pegs the jump toggles.
+
+        @type self: PegBoard
+        @type height: int
+        @type width: int
+        @type unused: int
+        @rtype: None
+        """
+        self.height, self.width, self.unused = height, width, unused
+        self.key = (height, width, unused)
+        self.jumps = []
+        # jumps into each hole, in the order top, right, bottom, left
+        for r in range(height):
+            for c in range(width):
+                for dr, dc in ((-1, 0), (0, 1), (1, 0), (0, -1)):
+                    if (0 <= r + 2 * dr < height and
+                            0 <= c + 2 * dc < width):
+                        cells = [(r + k * dr) * width + (c + k * dc)
+                                 for k in (2, 1, 0)]
+                        if not any([unused >> i & 1 for i in cells]):
+                            jumpers = (1 << cells[0]) | (1 << cells[1])
+                            landing = 1 << cells[2]
+                            self.jumps.append(
+                                (jumpers, landing, jumpers | landing))
+        # images of a bitboard under every symmetry other than the
+        # identity, packed side by side into one integer, cells bits
+        # apart; _images[k] maps byte k of a bitboard to its share of
+        # that integer
+        cells = height * width
+        targets = []
+        for move in _symmetries(height, width):
+            target = [move(i // width, i % width) for i in range(cells)]
+            if all([(unused >> i & 1) == (unused >> target[i] & 1)
+                    for i in range(cells)]):
+                targets.append(target)
+        self._shifts = [t * cells for t in range(len(targets))]
+        self._images = [[sum([_spread(value, 8 * k, target) << shift
+                              for target, shift in zip(targets,
+                                                       self._shifts)])
+                         for value in range(256)]
+                        for k in range((cells + 7) // 8)]
+
+    def canonical(self, pegs):
+        """
+        Return the smallest bitboard among pegs and its images under the
+        symmetries of PegBoard self, so that all rotations and
+        reflections of a position share one key.
 
-def make_top_board(board, x, y):
+        >>> board = peg_board(1, 3, 0)
+        >>> board.canonical(0b001), board.canonical(0b100)
+        (1, 1)
+
+        @type self: PegBoard
+        @type pegs: int
+        @rtype: int
+        """
+        packed, rest = 0, pegs
+        for table in self._images:
+            packed |= table[rest & 255]
+            rest >>= 8
+        full, best = (1 << (self.height * self.width)) - 1, pegs
+        for shift in self._shifts:
+            image = packed >> shift & full
+            if image < best:
+                best = image
+        return best
+
+
+def _symmetries(height, width):
     """
-    Return a new marker for an extension of GridPegSolitairePuzzle
+    Return functions mapping (row, column) to the cell number of its
+    image under each rotation and reflection of a height x width grid,
+    except the identity.  Quarter turns and diagonal reflections only
+    apply to square grids.
 
-    @type board: list[list[str]]
-    @type x: int
-    @type y: int
-    @rtype: list[list[str]]
+    >>> len(_symmetries(3, 3)), len(_symmetries(2, 3))
+    (7, 3)
+
+    @type height: int
+    @type width: int
+    @rtype: list[(int, int) -> int]
     """
-    copy = []
-    for row_num in range(len(board)):
-        if row_num == x-2:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('.')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        elif row_num == x-1:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('.')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        elif row_num == x:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('*')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        else:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-    return copy
-
-def make_right_board(board, x, y):
+    h, w = height - 1, width - 1
+    moves = [lambda r, c: (h - r) * width + (w - c),
+             lambda r, c: (h - r) * width + c,
+             lambda r, c: r * width + (w - c)]
+    if height == width:
+        moves += [lambda r, c: c * width + (h - r),
+                  lambda r, c: (w - c) * width + r,
+                  lambda r, c: c * width + r,
+                  lambda r, c: (w - c) * width + (h - r)]
+    return moves
+
+
+def _spread(value, offset, target):
     """
-    Return a new marker for an extension of GridPegSolitairePuzzle
+    Return the bitmask with bit target[offset + i] set for each bit i
+    set in value.
+
+    >>> _spread(0b11, 1, [0, 4, 2])
+    20
 
-    @type board: list[list[str]]
-    @type x: int
-    @type y: int
-    @rtype: list[list[str]]
+    @type value: int
+    @type offset: int
+    @type target: list[int]
+    @rtype: int
     """
-    copy = []
-    for row_num in range(len(board)):
-        if row_num == x:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('*')
-                elif col_num == y+1:
-                    copy_row.append('.')
-                elif col_num == y+2:
-                    copy_row.append('.')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        else:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-    return copy
-
-def make_bottom_board(board, x, y):
+    mask, i = 0, 0
+    while value and offset + i < len(target):
+        if value & 1:
+            mask |= 1 << target[offset + i]
+        value >>= 1
+        i += 1
+    return mask
+
+
+# the PegBoard of each shape seen so far
+_boards = {}
+
+
+def peg_board(height, width, unused):
     """
-    Return a new marker for an extension of GridPegSolitairePuzzle
+    Return the PegBoard of height rows, width columns and unused cells
+    unused, building its jump table only the first time it is asked for.
 
-    @type board: list[list[str]]
-    @type x: int
-    @type y: int
-    @rtype: list[list[str]]
+    @type height: int
+    @type width: int
+    @type unused: int
+    @rtype: PegBoard
     """
-    copy = []
-    for row_num in range(len(board)):
-        if row_num == x:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('*')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        elif row_num == x+1:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('.')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        elif row_num == x+2:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y:
-                    copy_row.append('.')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        else:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-    return copy
-
-def make_left_board(board, x, y):
+    key = (height, width, unused)
+    if key not in _boards:
+        _boards[key] = PegBoard(height, width, unused)
+    return _boards[key]
+
+
+def _mask(cells, marker):
     """
-    Return a new marker for an extension of GridPegSolitairePuzzle
+    Return the bitmask with bit i set iff cells[i] is marker.
+
+    >>> _mask(["*", ".", "*"], "*")
+    5
 
-    @type board: list[list[str]]
-    @type x: int
-    @type y: int
-    @rtype: list[list[str]]
+    @type cells: list[str]
+    @type marker: str
+    @rtype: int
     """
-    copy = []
-    for row_num in range(len(board)):
-        if row_num == x:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                if col_num == y-2:
-                    copy_row.append('.')
-                elif col_num == y-1:
-                    copy_row.append('.')
-                elif col_num == y:
-                    copy_row.append('*')
-                else:
-                    copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-        else:
-            copy_row = []
-            for col_num in range(len(board[row_num])):
-                copy_row.append(board[row_num][col_num])
-            copy.append(copy_row)
-    return copy
+    mask = 0
+    for i in range(len(cells)):
+        if cells[i] == marker:
+            mask |= 1 << i
+    return mask
+
 
 if __name__ == "__main__":
     from puzzle_tools import depth_first_solve
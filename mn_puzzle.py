@@ -1,4 +1,5 @@
 from puzzle import Puzzle
+from bisect import bisect_left
 import math
 
 
@@ -19,8 +20,34 @@ class MNPuzzle(Puzzle):
         assert all([len(r) == len(from_grid[0]) for r in from_grid])
         assert all([len(r) == len(to_grid[0]) for r in to_grid])
         self.n, self.m = len(from_grid), len(from_grid[0])
-        self.from_grid, self.to_grid = from_grid, to_grid
+        self.to_grid = to_grid
+        self._layout = goal_layout(to_grid)
+        cells = [cell for row in from_grid for cell in row]
+        assert sorted(cells) == self._layout.symbols
+        # _tiles[i] is the number of the tile in cell i, counting cells
+        # row by row, and _blank the cell holding "*"
+        self._tiles = self._layout.pack([self._layout.ids[cell]
+                                         for cell in cells])
+        self._blank = cells.index("*")
+        # True iff to_grid can be reached, found on demand
+        self._solvable = None
+        # heuristic state, filled in on demand and passed on to extensions
+        self._manhattan = None
+        self._row_conflicts, self._column_conflicts = None, None
+        # what apply changed, for undo, started on the first apply
+        self._history = None
+
+    @property
+    def from_grid(self):
+        """
+        Return the current grid of MNPuzzle self as a tuple of rows.
 
+        @type self: MNPuzzle
+        @rtype: tuple[tuple[str]]
+        """
+        symbols, m = self._layout.symbols, self.m
+        return tuple(tuple(symbols[t] for t in self._tiles[r * m:(r + 1) * m])
+                     for r in range(self.n))
 
     def __eq__(self, other):
         """
@@ -28,8 +55,21 @@ class MNPuzzle(Puzzle):
 
         @rtype: bool
         """
-        return type(self) == type(other) and self.from_grid == other.from_grid\
-               and self.to_grid == other.to_grid
+        return (type(self) == type(other) and self._tiles == other._tiles and
+                self._layout.key == other._layout.key)
+
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return the tiles of MNPuzzle self, cell by cell, as a bytes (or a
+        tuple, on grids of over 256 cells) of tile numbers, where tiles
+        are numbered in sorted order of their symbols.
+
+        @type self: MNPuzzle
+        @rtype: bytes | tuple[int]
+        """
+        return self._tiles
 
     def __str__(self):
         """
@@ -74,34 +114,142 @@ class MNPuzzle(Puzzle):
         @type self: MNPuzzle
         @rtype: list[MNPuzzle]
         """
-        legal = []
-        copy = MNPuzzle(self.from_grid, self.to_grid)
-        pos_space = position(self, '*')
-        row = pos_space[0]-1
-        column = pos_space[1]-1
-
-        if row-1 >= 0:
-            pos_cell = position(self, self.from_grid[row-1][column])
-            copy = switch_cells(self, pos_cell, pos_space)
-            legal.append(copy)
-            copy = MNPuzzle(self.from_grid, self.to_grid)
-        if row+1 < self.n:
-            pos_cell = position(self, self.from_grid[row+1][column])
-            copy = switch_cells(self, pos_cell, pos_space)
-            legal.append(copy)
-            copy = MNPuzzle(self.from_grid, self.to_grid)
-        if column-1 >= 0:
-            pos_cell = position(self, self.from_grid[row][column-1])
-            copy = switch_cells(self, pos_cell, pos_space)
-            legal.append(copy)
-            copy = MNPuzzle(self.from_grid, self.to_grid)
-        if column+1 < self.m:
-            pos_cell = position(self, self.from_grid[row][column+1])
-            copy = switch_cells(self, pos_cell, pos_space)
-            legal.append(copy)
-            copy = MNPuzzle(self.from_grid, self.to_grid)
-
-        return legal
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the legal extensions of MNPuzzle self one move at a time.
+
+        @type self: MNPuzzle
+        @rtype: generator[MNPuzzle]
+        """
+        blank, layout = self._blank, self._layout
+        for cell in layout.neighbours[blank]:
+            tiles = list(self._tiles)
+            tiles[blank], tiles[cell] = tiles[cell], tiles[blank]
+            child = MNPuzzle.__new__(MNPuzzle)
+            child.n, child.m, child.to_grid = self.n, self.m, self.to_grid
+            child._layout, child._tiles = layout, layout.pack(tiles)
+            child._blank, child._solvable = cell, self._solvable
+            child._history = None
+            self._pass_heuristic(child, cell, blank)
+            yield child
+
+    def move_to(self, extension):
+        """
+        Return the symbol of the tile that slides into the blank of
+        MNPuzzle self to reach extension.
+
+        >>> p = MNPuzzle((("1", "*"),), (("*", "1"),))
+        >>> p.move_to(p.extensions()[0])
+        '1'
+
+        @type self: MNPuzzle
+        @type extension: MNPuzzle
+        @rtype: str
+        """
+        return self._layout.symbols[extension._tiles[self._blank]]
+
+    def moves(self):
+        """
+        Return the cells next to the blank of MNPuzzle self, whose tiles
+        can slide into it, in the order of its extensions.
+
+        >>> MNPuzzle((("1", "*", "2"),), (("1", "2", "*"),)).moves()
+        [0, 2]
+
+        @type self: MNPuzzle
+        @rtype: list[int]
+        """
+        return self._layout.neighbours[self._blank][:]
+
+    def apply(self, move):
+        """
+        Slide the tile in cell move into the blank of MNPuzzle self.
+
+        >>> p = MNPuzzle((("1", "*", "2"),), (("1", "2", "*"),))
+        >>> p.apply(2); p.from_grid
+        (('1', '2', '*'),)
+
+        @type self: MNPuzzle
+        @type move: int
+        @rtype: None
+        """
+        blank, tiles = self._blank, self._tiles
+        if self._history is None:
+            self._history = []
+        self._history.append((tiles, blank, self._manhattan,
+                              self._row_conflicts, self._column_conflicts))
+        tiles = list(tiles)
+        tiles[blank], tiles[move] = tiles[move], tiles[blank]
+        self._tiles, self._blank = self._layout.pack(tiles), move
+        self._pass_heuristic(self, move, blank)
+
+    def undo(self, move):
+        """
+        Slide back the tile that apply(move) slid into the blank of
+        MNPuzzle self.
+
+        @type self: MNPuzzle
+        @type move: int
+        @rtype: None
+        """
+        (self._tiles, self._blank, self._manhattan, self._row_conflicts,
+         self._column_conflicts) = self._history.pop()
+
+    def pack_state(self):
+        """
+        Return the tiles of MNPuzzle self, cell by cell, as bytes: one
+        per tile, or two on grids of over 256 cells.
+
+        @type self: MNPuzzle
+        @rtype: bytes
+        """
+        if isinstance(self._tiles, bytes):
+            return self._tiles
+        return b"".join([t.to_bytes(2, "big") for t in self._tiles])
+
+    def unpack_state(self, data):
+        """
+        Return an MNPuzzle towards the same to_grid as MNPuzzle self,
+        with the tiles packed into data by pack_state.
+
+        >>> p = MNPuzzle((("1", "*", "2"),), (("1", "2", "*"),))
+        >>> p.unpack_state(p.pack_state()) == p
+        True
+
+        @type self: MNPuzzle
+        @type data: bytes
+        @rtype: MNPuzzle
+        """
+        layout = self._layout
+        other = MNPuzzle.__new__(MNPuzzle)
+        other.n, other.m, other.to_grid = self.n, self.m, self.to_grid
+        if layout.pack is bytes:
+            other._tiles = data
+        else:
+            other._tiles = tuple([int.from_bytes(data[i:i + 2], "big")
+                                  for i in range(0, len(data), 2)])
+        other._layout, other._blank = layout, other._tiles.index(layout.blank)
+        # every state reached from self is as solvable as self
+        other._solvable = self._solvable
+        other._manhattan = None
+        other._row_conflicts, other._column_conflicts = None, None
+        other._history = None
+        return other
+
+    # copy is left to Puzzle, so that searches build extensions rather
+    # than apply and undo moves: for MNPuzzle a move costs about as much
+    # as an extension, and undoing it comes on top
+
+    def reversed(self):
+        """
+        Return an MNPuzzle from to_grid towards from_grid.
+
+        @type self: MNPuzzle
+        @rtype: MNPuzzle
+        """
+        return MNPuzzle(self.to_grid, self.from_grid)
 
     # TODO
     # override is_solved
@@ -114,7 +262,243 @@ class MNPuzzle(Puzzle):
         @type self: MNPuzzle
         @rtype: bool
         """
-        return self.from_grid == self.to_grid
+        return self._tiles == self._layout.solved
+
+    def fail_fast(self):
+        """
+        Return True iff to_grid can't be reached from MNPuzzle self.
+
+        Every move swaps two cells and moves the blank by one, so the
+        parity of the permutation taking self to to_grid plus the
+        distance of the blank from its goal never changes; it is even at
+        to_grid.  On grids of one row or column, tiles can't pass each
+        other at all.
+
+        >>> MNPuzzle((("2", "1", "*"),), (("1", "2", "*"),)).fail_fast()
+        True
+        >>> MNPuzzle((("1", "2"), ("3", "*")),
+        ...          (("2", "1"), ("3", "*"))).fail_fast()
+        True
+        >>> MNPuzzle((("1", "2"), ("*", "3")),
+        ...          (("1", "2"), ("3", "*"))).fail_fast()
+        False
+
+        @type self: MNPuzzle
+        @rtype: bool
+        """
+        if self._solvable is None:
+            goal, layout = self._layout.goal, self._layout
+            targets = [goal[t] for t in self._tiles]
+            if self.n == 1 or self.m == 1:
+                order = [g for g in targets if g != goal[layout.blank]]
+                self._solvable = order == sorted(order)
+            else:
+                # parity of a permutation is that of its size minus its
+                # number of cycles
+                cycles, seen = 0, [False] * len(targets)
+                for i in range(len(targets)):
+                    if not seen[i]:
+                        cycles += 1
+                        while not seen[i]:
+                            seen[i], i = True, targets[i]
+                blank_goal = goal[layout.blank]
+                distance = (abs(self._blank // self.m - blank_goal // self.m) +
+                            abs(self._blank % self.m - blank_goal % self.m))
+                self._solvable = (len(targets) - cycles + distance) % 2 == 0
+        return not self._solvable
+
+    def heuristic(self):
+        """
+        Return the Manhattan distance plus linear conflicts of MNPuzzle
+        self, a lower bound on the moves left to reach to_grid.
+
+        @type self: MNPuzzle
+        @rtype: int
+        """
+        return manhattan_distance(self) + linear_conflict(self)
+
+    def _compute_heuristic(self):
+        # Compute the Manhattan distance and the conflicts of every row
+        # and column of MNPuzzle self from scratch.
+        #
+        # @type self: MNPuzzle
+        # @rtype: None
+        goal, blank, m = self._layout.goal, self._layout.blank, self.m
+        self._manhattan = sum([abs(i // m - goal[t] // m) +
+                               abs(i % m - goal[t] % m)
+                               for i, t in enumerate(self._tiles)
+                               if t != blank])
+        self._row_conflicts = [self._row_conflict(r) for r in range(self.n)]
+        self._column_conflicts = [self._column_conflict(c)
+                                  for c in range(self.m)]
+
+    def _row_conflict(self, r):
+        # Return the extra moves forced by tiles in row r that belong in
+        # row r but are out of order.
+        #
+        # @type self: MNPuzzle
+        # @type r: int
+        # @rtype: int
+        goal, blank, m = self._layout.goal, self._layout.blank, self.m
+        return _line_conflict([goal[t] % m
+                               for t in self._tiles[r * m:(r + 1) * m]
+                               if t != blank and goal[t] // m == r])
+
+    def _column_conflict(self, c):
+        # Return the extra moves forced by tiles in column c that belong in
+        # column c but are out of order.
+        #
+        # @type self: MNPuzzle
+        # @type c: int
+        # @rtype: int
+        goal, blank, m = self._layout.goal, self._layout.blank, self.m
+        return _line_conflict([goal[t] // m for t in self._tiles[c::m]
+                               if t != blank and goal[t] % m == c])
+
+    def _pass_heuristic(self, child, old, new):
+        # Fill in the heuristic state of child, an extension of MNPuzzle
+        # self made by sliding the tile in cell old into the blank in cell
+        # new.  Only the distance of that tile and the two lines it leaves
+        # and enters can change, so only those are recomputed.  child may
+        # be self, already moved by apply.
+        #
+        # @type self: MNPuzzle
+        # @type child: MNPuzzle
+        # @type old: int
+        # @type new: int
+        # @rtype: None
+        manhattan = self._manhattan
+        rows, columns = self._row_conflicts, self._column_conflicts
+        child._manhattan = None
+        child._row_conflicts, child._column_conflicts = rows, columns
+        if manhattan is None:
+            return
+        m, target = self.m, self._layout.goal[child._tiles[new]]
+        goal_row, goal_column = target // m, target % m
+        (old_row, old_column), (new_row, new_column) = (divmod(old, m),
+                                                        divmod(new, m))
+        child._manhattan = (manhattan +
+                            abs(new_row - goal_row) - abs(old_row - goal_row) +
+                            abs(new_column - goal_column) -
+                            abs(old_column - goal_column))
+        # the lists may be shared with other puzzles, so they are copied
+        # rather than changed
+        if old_row != new_row:
+            child._row_conflicts = rows[:]
+            for r in (old_row, new_row):
+                child._row_conflicts[r] = child._row_conflict(r)
+        else:
+            child._column_conflicts = columns[:]
+            for c in (old_column, new_column):
+                child._column_conflicts[c] = child._column_conflict(c)
+
+
+class GoalLayout:
+    """
+    What every MNPuzzle working towards one goal grid shares: the
+    numbering of its tiles, where each belongs, and which cells are
+    next to each other.
+    """
+
+    def __init__(self, to_grid):
+        """
+        Create a new GoalLayout self for MNPuzzles working towards
+        to_grid.
+
+        @type self: GoalLayout
+        @type to_grid: tuple[tuple[str]]
+        @rtype: None
+        """
+        self.key = tuple(tuple(row) for row in to_grid)
+        n, m = len(to_grid), len(to_grid[0])
+        cells = [cell for row in to_grid for cell in row]
+        assert "*" in cells and len(set(cells)) == len(cells)
+        # tiles are numbered by sorted symbol, so that the numbers don't
+        # depend on the goal and reversed puzzles share state keys
+        self.symbols = sorted(cells)
+        self.ids = {symbol: t for t, symbol in enumerate(self.symbols)}
+        self.blank = self.ids["*"]
+        # goal[t] is the cell tile t belongs in
+        self.goal = [0] * len(cells)
+        for i, cell in enumerate(cells):
+            self.goal[self.ids[cell]] = i
+        self.pack = bytes if len(cells) <= 256 else tuple
+        self.solved = self.pack([self.ids[cell] for cell in cells])
+        self.neighbours = []
+        for i in range(n * m):
+            row, column = divmod(i, m)
+            self.neighbours.append(
+                [r * m + c for r, c in ((row - 1, column), (row + 1, column),
+                                        (row, column - 1), (row, column + 1))
+                 if 0 <= r < n and 0 <= c < m])
+
+
+# the GoalLayout of each goal grid seen so far
+_layouts = {}
+
+
+def goal_layout(to_grid):
+    """
+    Return the GoalLayout for to_grid, building it only the first time
+    it is asked for.
+
+    @type to_grid: tuple[tuple[str]]
+    @rtype: GoalLayout
+    """
+    key = tuple(tuple(row) for row in to_grid)
+    if key not in _layouts:
+        _layouts[key] = GoalLayout(key)
+    return _layouts[key]
+
+
+def manhattan_distance(puzzle):
+    """
+    Return the sum, over all tiles of puzzle, of the rows and columns
+    between each tile and its place in to_grid.
+
+    @type puzzle: MNPuzzle
+    @rtype: int
+    """
+    if puzzle._manhattan is None:
+        puzzle._compute_heuristic()
+    return puzzle._manhattan
+
+
+def linear_conflict(puzzle):
+    """
+    Return the moves, beyond the Manhattan distance, needed to take
+    tiles already in their goal row or column past each other.
+
+    @type puzzle: MNPuzzle
+    @rtype: int
+    """
+    if puzzle._manhattan is None:
+        puzzle._compute_heuristic()
+    return sum(puzzle._row_conflicts) + sum(puzzle._column_conflicts)
+
+
+def _line_conflict(goals):
+    """
+    Return twice the fewest tiles that must leave a line so that the
+    rest are in goal order, given the goal places of its tiles in order.
+
+    >>> _line_conflict([0, 1, 2])
+    0
+    >>> _line_conflict([2, 1, 0])
+    4
+
+    @type goals: list[int]
+    @rtype: int
+    """
+    # longest increasing subsequence, by patience sorting
+    tails = []
+    for g in goals:
+        i = bisect_left(tails, g)
+        if i == len(tails):
+            tails.append(g)
+        else:
+            tails[i] = g
+    return 2 * (len(goals) - len(tails))
 
 
 # helper function
@@ -0,0 +1,321 @@
+"""
+Disjoint additive pattern databases for MNPuzzle.
+
+The tiles of a goal grid are split into disjoint groups.  For each group,
+a table records the fewest moves of that group's tiles needed to bring
+them from any placement to their places in the goal, ignoring all other
+tiles.  Since no move shifts tiles of two groups, the table entries of
+all groups add up to an admissible heuristic that is much stronger than
+Manhattan distance.
+
+Tables are built once per goal grid by breadth-first search backwards
+from the goal, saved as one flat byte array per group, and loaded back
+with mmap so that a saved database is ready to use immediately.
+
+A database's heuristic method takes the larger of its sum and the
+puzzle's own Manhattan distance plus linear conflicts, so that using a
+database never weakens the estimate.
+"""
+import hashlib
+import json
+import mmap
+import os
+from mn_puzzle import MNPuzzle, goal_layout
+
+_MAGIC = b"MNPDB1\n"
+# table entries are single bytes; this marks placements not yet reached
+_UNSEEN = 255
+
+
+class PatternDatabase:
+    """
+    An admissible heuristic for MNPuzzles working towards one goal grid,
+    made of one move table per group of tiles.
+    """
+
+    def __init__(self, n, m, goal, groups, tables, buffer=None):
+        """
+        Create a new PatternDatabase self for nxm grids with goal cells
+        goal, listed row by row, and with tables[i] holding the moves
+        needed by the tiles in groups[i].  buffer is the mapping the
+        tables live in, if any, and is closed by close.
+
+        @type self: PatternDatabase
+        @type n: int
+        @type m: int
+        @type goal: list[str]
+        @type groups: list[list[str]]
+        @type tables: list[bytes | bytearray | memoryview]
+        @type buffer: mmap.mmap | None
+        @rtype: None
+        """
+        self.n, self.m = n, m
+        self.goal, self.groups = goal, groups
+        self._tables, self._buffer = tables, buffer
+        # tile numbers of each group, as used in MNPuzzle state keys
+        ids = goal_layout([goal[r * m:(r + 1) * m] for r in range(n)]).ids
+        self._group_ids = [[ids[tile] for tile in group] for group in groups]
+
+    def __call__(self, puzzle):
+        """
+        Return the sum, over all groups, of the moves needed to bring the
+        tiles of the group to their goal places in puzzle.
+
+        Precondition: puzzle.to_grid has the cells of self.goal.
+
+        @type self: PatternDatabase
+        @type puzzle: MNPuzzle
+        @rtype: int
+        """
+        cells = self.n * self.m
+        where = [0] * cells
+        for i, t in enumerate(puzzle.state_key()):
+            where[t] = i
+        return sum([table[_rank([where[t] for t in group], cells)]
+                    for group, table in zip(self._group_ids, self._tables)])
+
+    def heuristic(self, puzzle):
+        """
+        Return the larger of the estimate of PatternDatabase self and
+        the Manhattan distance plus linear conflicts of puzzle, both
+        lower bounds on the moves left to reach to_grid.
+
+        >>> goal = (("1", "2", "3"), ("4", "5", "6"), ("7", "8", "*"))
+        >>> pdb = build_pattern_database(goal, [["1"], ["2"]])
+        >>> p = MNPuzzle((("1", "2", "3"), ("4", "5", "6"),
+        ...               ("8", "7", "*")), goal)
+        >>> pdb(p), pdb.heuristic(p)
+        (0, 4)
+
+        Precondition: puzzle.to_grid has the cells of self.goal.
+
+        @type self: PatternDatabase
+        @type puzzle: MNPuzzle
+        @rtype: int
+        """
+        return max(self(puzzle), puzzle.heuristic())
+
+    def save(self, path):
+        """
+        Write PatternDatabase self to the file at path.
+
+        @type self: PatternDatabase
+        @type path: str
+        @rtype: None
+        """
+        header = {"n": self.n, "m": self.m, "goal": self.goal,
+                  "groups": self.groups,
+                  "sizes": [len(table) for table in self._tables]}
+        with open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for table in self._tables:
+                f.write(table)
+
+    def close(self):
+        """
+        Release the file mapping of PatternDatabase self, if it has one.
+        Self can't be used afterwards.
+
+        @type self: PatternDatabase
+        @rtype: None
+        """
+        if self._buffer is not None:
+            for table in self._tables:
+                table.release()
+            self._buffer.close()
+            self._buffer = None
+
+
+def build_pattern_database(to_grid, groups=None):
+    """
+    Return a PatternDatabase for MNPuzzles working towards to_grid,
+    with one table for each group of tiles in groups, or for the groups
+    of default_groups if groups is None.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[list[str]] | None
+    @rtype: PatternDatabase
+    """
+    n, m = len(to_grid), len(to_grid[0])
+    goal = [cell for row in to_grid for cell in row]
+    if groups is None:
+        groups = default_groups(to_grid)
+    assert len(set(sum(groups, []))) == len(sum(groups, []))
+    assert all([tile in goal and tile != "*" for tile in sum(groups, [])])
+    neighbours = goal_layout(to_grid).neighbours
+    tables = [_build_table([goal.index(tile) for tile in group],
+                           goal.index("*"), neighbours)
+              for group in groups]
+    return PatternDatabase(n, m, goal, [list(g) for g in groups], tables)
+
+
+def load_pattern_database(path):
+    """
+    Return the PatternDatabase saved at path, with its tables mapped
+    read-only from the file rather than read into memory.
+
+    @type path: str
+    @rtype: PatternDatabase
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(_MAGIC)] != _MAGIC:
+        buffer.close()
+        raise ValueError("{} is not a pattern database".format(path))
+    end = buffer.find(b"\n", len(_MAGIC))
+    header = json.loads(buffer[len(_MAGIC):end].decode("utf-8"))
+    view, offset, tables = memoryview(buffer), end + 1, []
+    for size in header["sizes"]:
+        tables.append(view[offset:offset + size])
+        offset += size
+    view.release()
+    return PatternDatabase(header["n"], header["m"], header["goal"],
+                           header["groups"], tables, buffer)
+
+
+def cached_pattern_database(to_grid, directory, groups=None):
+    """
+    Return the PatternDatabase for to_grid and groups saved in
+    directory, building and saving it there first if it isn't yet.
+
+    @type to_grid: tuple[tuple[str]]
+    @type directory: str
+    @type groups: list[list[str]] | None
+    @rtype: PatternDatabase
+    """
+    if groups is None:
+        groups = default_groups(to_grid)
+    name = hashlib.sha1(json.dumps([[list(row) for row in to_grid],
+                                    groups]).encode("utf-8")).hexdigest()
+    path = os.path.join(directory, "{}x{}-{}.pdb".format(
+        len(to_grid), len(to_grid[0]), name[:16]))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        # write under a temporary name so a concurrent loader never
+        # maps a half-written file
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        build_pattern_database(to_grid, groups).save(temporary)
+        os.replace(temporary, path)
+    return load_pattern_database(path)
+
+
+def default_groups(to_grid, size=5):
+    """
+    Return the tiles of to_grid split into groups of at most size tiles
+    that sit close together in to_grid, since a group's table only
+    counts the moves its own tiles get in each other's way.
+
+    Tiles are taken in bands of two rows, column by column, left to
+    right along the first band, right to left along the next, and so
+    on.  On the 15-puzzle this gives the usual 5-5-5 split into the top
+    left, the right and the bottom left of the grid.
+
+    >>> default_groups((("1", "2", "3"), ("4", "5", "*")), 3)
+    [['1', '4', '2'], ['5', '3']]
+    >>> goal = [list("1234"), list("5678"), list("9ABC"), list("DEF*")]
+    >>> [sorted(group) for group in default_groups(goal)]
+    [['1', '2', '3', '5', '6'], ['4', '7', '8', 'B', 'C'], \
+['9', 'A', 'D', 'E', 'F']]
+
+    @type to_grid: tuple[tuple[str]]
+    @type size: int
+    @rtype: list[list[str]]
+    """
+    n, m, tiles = len(to_grid), len(to_grid[0]), []
+    for band in range(0, n, 2):
+        columns = range(m) if band % 4 == 0 else range(m - 1, -1, -1)
+        for c in columns:
+            for r in range(band, min(band + 2, n)):
+                if to_grid[r][c] != "*":
+                    tiles.append(to_grid[r][c])
+    return [tiles[i:i + size] for i in range(0, len(tiles), size)]
+
+
+def _build_table(goal, blank, neighbours):
+    """
+    Return a table, indexed by _rank of placement, of the fewest moves
+    of the tiles at cells goal needed to reach goal from each placement
+    of those tiles, with the blank starting at cell blank.
+
+    The search runs backwards from the goal one cost level at a time.
+    Moving the blank onto a cell outside the group is free, so each
+    level is first closed under those moves before the moves of group
+    tiles start the next level.
+
+    @type goal: list[int]
+    @type blank: int
+    @type neighbours: list[list[int]]
+    @rtype: bytearray
+    """
+    cells = len(neighbours)
+    table = bytearray([_UNSEEN]) * _placements(cells, len(goal))
+    seen = bytearray(len(table) * cells)
+    level, cost = [(tuple(goal), blank)], 0
+    while level:
+        assert cost < _UNSEEN
+        next_level, stack = [], []
+        for placement, blank in level:
+            rank = _rank(placement, cells)
+            if not seen[rank * cells + blank]:
+                seen[rank * cells + blank] = 1
+                stack.append((placement, blank, rank))
+        while stack:
+            placement, blank, rank = stack.pop()
+            if table[rank] == _UNSEEN:
+                table[rank] = cost
+            for cell in neighbours[blank]:
+                if cell in placement:
+                    i = placement.index(cell)
+                    next_level.append(
+                        (placement[:i] + (blank,) + placement[i + 1:], cell))
+                elif not seen[rank * cells + cell]:
+                    seen[rank * cells + cell] = 1
+                    stack.append((placement, cell, rank))
+        level, cost = next_level, cost + 1
+    return table
+
+
+def _placements(cells, k):
+    """
+    Return the number of ways to put k distinct tiles on cells cells.
+
+    >>> _placements(16, 2)
+    240
+
+    @type cells: int
+    @type k: int
+    @rtype: int
+    """
+    result = 1
+    for i in range(k):
+        result *= cells - i
+    return result
+
+
+def _rank(placement, cells):
+    """
+    Return a distinct index below _placements(cells, len(placement)) for
+    the placement of tiles on distinct cells.
+
+    >>> sorted([_rank((a, b), 3) for a in range(3) for b in range(3) \
+                if a != b])
+    [0, 1, 2, 3, 4, 5]
+
+    @type placement: tuple[int] | list[int]
+    @type cells: int
+    @rtype: int
+    """
+    rank = 0
+    for i, p in enumerate(placement):
+        smaller = 0
+        for q in placement[:i]:
+            if q < p:
+                smaller += 1
+        rank = rank * (cells - i) + p - smaller
+    return rank
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -4,6 +4,36 @@ class Puzzle:
     or even unsolvable.
     """
 
+    def state_key(self):
+        """
+        Return a compact, hashable key for the state of Puzzle self.
+
+        Solvers use these keys for duplicate detection, so two puzzles
+        met in the same search may only share a key if each can be
+        solved in as many moves as the other: the same state, or, say,
+        a mirror image of it.  Keys describe the current position only,
+        not the goal, which every puzzle in one search shares.
+
+        Override this in a subclass with something cheaper to build and
+        compare than the default, which is str(self).
+
+        @type self: Puzzle
+        @rtype: Hashable
+        """
+        return str(self)
+
+    def __hash__(self):
+        """
+        Return a hash of Puzzle self consistent with its state_key.
+
+        Subclasses that override __eq__ must set __hash__ again, since
+        Python drops an inherited __hash__ in that case.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return hash(self.state_key())
+
     def fail_fast(self):
         """
         Return True iff Puzzle self can never be extended to a solution.
@@ -16,6 +46,34 @@ class Puzzle:
         """
         return False
 
+    def heuristic(self):
+        """
+        Return an estimate of the number of moves from Puzzle self to a
+        solution, for use by informed solvers.
+
+        Override this in a subclass where you can estimate the distance
+        to a solution.  The estimate must never exceed the true distance,
+        or solvers that promise shortest paths may return longer ones.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return 0
+
+    def reversed(self):
+        """
+        Return a puzzle that starts from the solution of Puzzle self and
+        is solved in the state of Puzzle self.
+
+        Override this in a subclass whose moves can all be undone and
+        whose solution is known up front, so that it can be searched
+        from both ends at once.
+
+        @type self: Puzzle
+        @rtype: Puzzle
+        """
+        raise NotImplementedError
+
     def is_solved(self):
         """
         Return True iff Puzzle self is solved.
@@ -38,4 +96,111 @@ class Puzzle:
         @type self: Puzzle
         @rtype: list[Puzzle]
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def iter_extensions(self):
+        """
+        Yield the legal extensions of Puzzle self, in the order of
+        extensions.
+
+        Depth-first searches take extensions from here, and often need
+        only the first few.  Override this in a subclass that can build
+        each extension as it is asked for, rather than all of them up
+        front as the default does.
+
+        @type self: Puzzle
+        @rtype: generator[Puzzle]
+        """
+        yield from self.extensions()
+
+    def move_to(self, extension):
+        """
+        Return a short description of the move that takes Puzzle self to
+        extension, for listing the moves of a solution.
+
+        Override this in a subclass with something shorter than the
+        default, which is extension itself as a string.
+
+        Precondition: extension is an extension of self.
+
+        @type self: Puzzle
+        @type extension: Puzzle
+        @rtype: Hashable
+        """
+        return str(extension)
+
+    def moves(self):
+        """
+        Return a list of the legal moves of Puzzle self, one for each
+        extension and in the same order, as taken by apply and undo.
+
+        moves, apply, undo and copy go together: a subclass that
+        overrides all four can be searched depth-first by changing one
+        puzzle in place, rather than building a new puzzle for every
+        extension.  Puzzles are only copied for the path returned.
+
+        @type self: Puzzle
+        @rtype: list[Hashable]
+        """
+        raise NotImplementedError
+
+    def apply(self, move):
+        """
+        Change Puzzle self, in place, into its extension by move.
+
+        Precondition: move is in self.moves().
+
+        @type self: Puzzle
+        @type move: Hashable
+        @rtype: None
+        """
+        raise NotImplementedError
+
+    def undo(self, move):
+        """
+        Change Puzzle self, in place, back to the puzzle that
+        self.apply(move) was called on.
+
+        Precondition: move is the last move applied to self and not yet
+        undone.
+
+        @type self: Puzzle
+        @type move: Hashable
+        @rtype: None
+        """
+        raise NotImplementedError
+
+    def copy(self):
+        """
+        Return a puzzle equivalent to Puzzle self that apply and undo
+        can change without changing self.
+
+        @type self: Puzzle
+        @rtype: Puzzle
+        """
+        raise NotImplementedError
+
+    def pack_state(self):
+        """
+        Return the state key of Puzzle self packed into bytes, the same
+        number of them for every puzzle met in one search, and ordered
+        consistently with equality of state keys.
+
+        pack_state and unpack_state go together: a subclass that
+        overrides both can be searched with its states kept on disk.
+
+        @type self: Puzzle
+        @rtype: bytes
+        """
+        raise NotImplementedError
+
+    def unpack_state(self, data):
+        """
+        Return a puzzle of the same search as Puzzle self, in the state
+        that pack_state packed into data.
+
+        @type self: Puzzle
+        @type data: bytes
+        @rtype: Puzzle
+        """
+        raise NotImplementedError
@@ -2,17 +2,1196 @@
 Some functions for working with puzzles
 """
 from puzzle import Puzzle
-from collections import deque
-# set higher recursion limit
-# which is needed in PuzzleNode.__str__
-# uncomment the next two lines on a unix platform, say CDF
-# import resource
-# resource.setrlimit(resource.RLIMIT_STACK, (2**29, -1))
-import sys
-sys.setrecursionlimit(10**6)
+from collections import deque, OrderedDict
+from heapq import heappush, heappop, merge
+from itertools import count
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import time
+
+
+class Solver:
+    """
+    A search strategy that finds a path from a Puzzle to a solution.
+
+    All search state lives in local variables of search, so one Solver
+    may run several solves at once, in different threads, and keeps
+    nothing alive between them.
+    """
+
+    def solve(self, puzzle, stats=None, budget=None):
+        """
+        Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+        a solution, with each child containing an extension of the puzzle
+        in its parent.  Return None if this is not possible.
+
+        If stats is not None, add the work done by the search to it.  If
+        budget is not None, raise BudgetExceeded as soon as the search
+        goes beyond it.
+
+        @type self: Solver
+        @type puzzle: Puzzle
+        @type stats: SearchStats | None
+        @type budget: Budget | None
+        @rtype: PuzzleNode | None
+        """
+        if stats is None:
+            stats = SearchStats(timed=False)
+        if budget is not None:
+            budget.start()
+        stats.budget = budget
+        start = time.perf_counter()
+        try:
+            return self.search(puzzle, stats)
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.budget = None
+
+    def search(self, puzzle, stats):
+        """
+        Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+        a solution, as for solve, counting the work done in stats.
+
+        This is an abstract method that must be implemented
+        in a subclass.
+
+        @type self: Solver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        raise NotImplementedError
+
+
+class SearchStats:
+    """
+    Counters of the work done by solves, updated as they run.
+
+    expanded counts the puzzles whose extensions were asked for, and
+    generated the extensions made.  duplicates counts extensions
+    skipped because their state was met before, and pruned the puzzles
+    fail_fast ruled out.  peak_frontier is the most puzzles waiting to
+    be expanded at once, and peak_visited the most states remembered.
+    The seconds spent in solve, and in each of the puzzles' extensions,
+    is_solved and fail_fast methods, are kept in the fields ending in
+    _seconds.
+    """
+
+    fields = ("expanded", "generated", "duplicates", "pruned",
+              "peak_frontier", "peak_visited", "seconds",
+              "extensions_seconds", "is_solved_seconds",
+              "fail_fast_seconds")
+
+    def __init__(self, callback=None, timed=True):
+        """
+        Create a new SearchStats self with every counter at zero.
+
+        If callback is not None, solvers call callback(puzzle, self)
+        as each puzzle is expanded, for reporting progress.  If timed
+        is False, the puzzle methods aren't timed, which saves a little
+        time on puzzles whose methods are cheap.
+
+        @type self: SearchStats
+        @type callback: (Puzzle, SearchStats) -> Any | None
+        @type timed: bool
+        @rtype: None
+        """
+        self.callback, self.timed = callback, timed
+        # the Budget of the solve under way, if it has one
+        self.budget = None
+        self.expanded = self.generated = 0
+        self.duplicates = self.pruned = 0
+        self.peak_frontier = self.peak_visited = 0
+        self.seconds = self.extensions_seconds = 0.0
+        self.is_solved_seconds = self.fail_fast_seconds = 0.0
+
+    def expand(self, puzzle, frontier, visited, depth=None, estimate=None):
+        """
+        Count the expansion of puzzle, with frontier puzzles waiting to
+        be expanded and visited states remembered.  depth is the number
+        of moves puzzle was reached in, and estimate the solver's
+        estimate of the moves left from it, where the solver knows them.
+
+        @type self: SearchStats
+        @type puzzle: Puzzle
+        @type frontier: int
+        @type visited: int
+        @type depth: int | None
+        @type estimate: int | None
+        @rtype: None
+        """
+        self.expanded += 1
+        if frontier > self.peak_frontier:
+            self.peak_frontier = frontier
+        if visited > self.peak_visited:
+            self.peak_visited = visited
+        if self.callback is not None:
+            self.callback(puzzle, self)
+        if self.budget is not None:
+            self.budget.check(self, puzzle, depth, estimate)
+
+    def as_dict(self):
+        """
+        Return the counters of SearchStats self by name.
+
+        >>> SearchStats().as_dict()["expanded"]
+        0
+
+        @type self: SearchStats
+        @rtype: dict[str, int | float]
+        """
+        return {name: getattr(self, name) for name in self.fields}
+
+    def merge(self, counters):
+        """
+        Add counters, as returned by as_dict, to SearchStats self, taking
+        the larger of each peak.
+
+        @type self: SearchStats
+        @type counters: dict[str, int | float]
+        @rtype: None
+        """
+        for name in self.fields:
+            if name.startswith("peak_"):
+                setattr(self, name, max(getattr(self, name), counters[name]))
+            else:
+                setattr(self, name, getattr(self, name) + counters[name])
+
+
+class Budget:
+    """
+    Limits on one solve at a time: on the puzzles it expands, the
+    seconds it runs, and the states it remembers, which is what its
+    memory use grows with.  A solve also stops once cancel is set, from
+    any thread.
+
+    While a solve runs, its budget keeps the puzzle expanded so far that
+    is closest to a solution, as the best partial progress to report if
+    the budget runs out: the one with the lowest estimate of the moves
+    left, for solvers that estimate them, and otherwise the one the most
+    moves from the start, the first among equals.
+    """
+
+    def __init__(self, nodes=None, seconds=None, states=None, cancel=None):
+        """
+        Create a new Budget self allowing a solve nodes expansions,
+        seconds seconds and states remembered states, without limit
+        where None, until cancel is set, if cancel is not None.
+
+        @type self: Budget
+        @type nodes: int | None
+        @type seconds: float | None
+        @type states: int | None
+        @type cancel: threading.Event | multiprocessing.Event | None
+        @rtype: None
+        """
+        self.nodes, self.seconds, self.states = nodes, seconds, states
+        self.cancel = cancel
+        self._deadline, self._used = None, 0
+        self._best, self._best_depth, self._best_estimate = None, None, None
+
+    def start(self):
+        """
+        Start the limits of Budget self afresh, for a new solve.
+
+        @type self: Budget
+        @rtype: None
+        """
+        self._deadline = (None if self.seconds is None else
+                          time.perf_counter() + self.seconds)
+        self._used = 0
+        self._best, self._best_depth, self._best_estimate = None, None, None
+
+    def check(self, stats, puzzle=None, depth=None, estimate=None):
+        """
+        Record that the solve counted in stats has expanded puzzle, if
+        puzzle is not None, reached in depth moves and estimated to be
+        estimate moves from a solution, where known, and raise
+        BudgetExceeded if the solve has gone beyond Budget self.
+
+        @type self: Budget
+        @type stats: SearchStats
+        @type puzzle: Puzzle | None
+        @type depth: int | None
+        @type estimate: int | None
+        @rtype: None
+        """
+        if puzzle is not None:
+            self._used += 1
+            if estimate is not None:
+                better = (self._best_estimate is None or
+                          estimate < self._best_estimate)
+            else:
+                better = depth is not None and (self._best_depth is None or
+                                                depth > self._best_depth)
+            if better:
+                # a puzzle searched in place changes after this call
+                self._best = puzzle.copy() if _in_place(puzzle) else puzzle
+                self._best_depth, self._best_estimate = depth, estimate
+        if self.nodes is not None and self._used > self.nodes:
+            reason = "nodes"
+        elif self.states is not None and stats.peak_visited > self.states:
+            reason = "states"
+        elif self.cancel is not None and self.cancel.is_set():
+            reason = "cancelled"
+        elif (self._deadline is not None and
+              time.perf_counter() > self._deadline):
+            reason = "seconds"
+        else:
+            return
+        raise BudgetExceeded(reason, self._best, stats)
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised by Solver.solve when a solve goes beyond its Budget.
+
+    reason is "nodes", "seconds", "states" or "cancelled"; best is the
+    puzzle closest to a solution that the solve expanded, as kept by
+    its Budget, or None; and stats holds the work done.
+    """
+
+    def __init__(self, reason, best, stats):
+        """
+        Create a new BudgetExceeded self for a solve stopped for reason,
+        having got as far as best, with the work done counted in stats.
+
+        @type self: BudgetExceeded
+        @type reason: str
+        @type best: Puzzle | None
+        @type stats: SearchStats
+        @rtype: None
+        """
+        Exception.__init__(self, "search budget exceeded: {}".format(reason))
+        self.reason, self.best, self.stats = reason, best, stats
+
+
+class DepthFirstSolver(Solver):
+    """
+    Depth-first search over an explicit stack, so deep searches never
+    touch the interpreter's recursion limit.  Puzzles that can apply and
+    undo their moves are searched as one copy, changed in place.
+    """
+
+    def __init__(self, table=None):
+        """
+        Create a new DepthFirstSolver self.  If table is None, each solve
+        remembers every puzzle it meets.  Otherwise it only remembers, in
+        table, puzzles found to have no solution, so memory stays within
+        the table's capacity and later solves skip those puzzles too.
+
+        Precondition: if table is not None, no sequence of moves leads
+        back to an earlier state, as in peg solitaire or sudoku, and
+        table is not used by two solves at once.
+
+        @type self: DepthFirstSolver
+        @type table: TranspositionTable | None
+        @rtype: None
+        """
+        self.table = table
+
+    def search(self, puzzle, stats):
+        """
+        Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+        a solution, found by depth-first search.  Return None if this is
+        not possible.
+
+        @type self: DepthFirstSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        is_solved, fail_fast, iter_extensions, _ = _probes(stats)
+        if is_solved(puzzle):
+            return build_path([puzzle])
+        dead = self.table
+        key = puzzle.state_key()
+        if dead is not None and key in dead:
+            stats.duplicates += 1
+            return None
+        if fail_fast(puzzle):
+            stats.pruned += 1
+            if dead is not None:
+                dead.add(key)
+            return None
+        # without a table, every key met is skipped from then on
+        seen = {key} if dead is None else dead
+        if _in_place(puzzle):
+            return self._search_in_place(puzzle, key, seen, stats)
+        # path[i], with key keys[i], is the puzzle whose unexplored
+        # children are in children[i]; together they stand in for the
+        # call stack
+        path, keys = [puzzle], [key]
+        children = [iter_extensions(puzzle)]
+        stats.expand(puzzle, 1, len(seen), depth=0)
+        while children:
+            child = next(children[-1], None)
+            if child is None:
+                children.pop()
+                path.pop()
+                key = keys.pop()
+                if dead is not None:
+                    # every extension was explored without a solution
+                    dead.add(key)
+                continue
+            stats.generated += 1
+            key = child.state_key()
+            if key in seen:
+                stats.duplicates += 1
+                continue
+            if dead is None:
+                seen.add(key)
+            if is_solved(child):
+                path.append(child)
+                return build_path(path)
+            if not fail_fast(child):
+                path.append(child)
+                keys.append(key)
+                children.append(iter_extensions(child))
+                stats.expand(child, len(children), len(seen),
+                             depth=len(path) - 1)
+            else:
+                stats.pruned += 1
+                if dead is not None:
+                    dead.add(key)
+        return None
+
+    def _search_in_place(self, puzzle, key, seen, stats):
+        # Return what search returns, searching a copy of puzzle, whose
+        # state key is key, by applying and undoing its moves.  seen
+        # holds the keys to skip.
+        #
+        # @type self: DepthFirstSolver
+        # @type puzzle: Puzzle
+        # @type key: Hashable
+        # @type seen: set[Hashable] | TranspositionTable
+        # @type stats: SearchStats
+        # @rtype: PuzzleNode | None
+        is_solved, fail_fast, _, _ = _probes(stats)
+        dead, state = self.table, puzzle.copy()
+        moves, apply, undo = _move_probes(stats, state)
+        # made[i] leads from the puzzle with key keys[i], whose moves
+        # left to try are in pending[i], to the next one
+        made, keys, pending = [], [key], [iter(moves())]
+        stats.expand(state, 1, len(seen), depth=0)
+        while pending:
+            move = next(pending[-1], None)
+            if move is None:
+                pending.pop()
+                key = keys.pop()
+                if dead is not None:
+                    # every move was explored without a solution
+                    dead.add(key)
+                if made:
+                    undo(made.pop())
+                continue
+            apply(move)
+            stats.generated += 1
+            key = state.state_key()
+            if key in seen:
+                stats.duplicates += 1
+                undo(move)
+                continue
+            if dead is None:
+                seen.add(key)
+            if is_solved(state):
+                made.append(move)
+                return build_path(_replay(puzzle, made))
+            if not fail_fast(state):
+                made.append(move)
+                keys.append(key)
+                pending.append(iter(moves()))
+                stats.expand(state, len(pending), len(seen),
+                             depth=len(made))
+            else:
+                stats.pruned += 1
+                if dead is not None:
+                    dead.add(key)
+                undo(move)
+        return None
+
+
+class TranspositionTable:
+    """
+    A bounded set of state keys of puzzles known to have no solution.
+    When full, the key least recently added or found is dropped.
+    """
+
+    def __init__(self, capacity=2 ** 20):
+        """
+        Create a new, empty TranspositionTable self holding at most
+        capacity keys.
+
+        @type self: TranspositionTable
+        @type capacity: int
+        @rtype: None
+        """
+        assert capacity > 0
+        self.capacity = capacity
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        """
+        Return whether key is in TranspositionTable self, marking it as
+        recently used if so.
+
+        >>> table = TranspositionTable(2)
+        >>> table.add(1); table.add(2); 1 in table
+        True
+        >>> table.add(3); sorted(table._keys)
+        [1, 3]
+
+        @type self: TranspositionTable
+        @type key: Hashable
+        @rtype: bool
+        """
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self):
+        """
+        Return the number of keys in TranspositionTable self.
+
+        @type self: TranspositionTable
+        @rtype: int
+        """
+        return len(self._keys)
+
+    def add(self, key):
+        """
+        Add key to TranspositionTable self, dropping the least recently
+        used key if self is full.
+
+        @type self: TranspositionTable
+        @type key: Hashable
+        @rtype: None
+        """
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+
+class ParallelDepthFirstSolver(Solver):
+    """
+    Depth-first search of one puzzle spread over several processes.
+
+    The puzzles a few moves from the root are searched breadth-first
+    here, and the subtrees below them handed out to worker processes.
+    A worker that sees another worker idle with nothing queued gives
+    away half of the shallowest unexplored siblings on its stack, so a
+    few large subtrees don't leave most workers waiting.  The first
+    solution found stops every worker.
+
+    Puzzles are sent between processes, so must be picklable.
+    """
+
+    def __init__(self, workers=None, depth=2, check=256):
+        """
+        Create a new ParallelDepthFirstSolver self running workers
+        worker processes, or one per CPU if workers is None, on the
+        subtrees depth moves below the root.  Each worker looks for idle
+        workers and for a solution found elsewhere every check puzzles.
+
+        @type self: ParallelDepthFirstSolver
+        @type workers: int | None
+        @type depth: int
+        @type check: int
+        @rtype: None
+        """
+        assert depth >= 0 and check > 0
+        self.workers = workers or os.cpu_count() or 1
+        self.depth, self.check = depth, check
+
+    def search(self, puzzle, stats):
+        """
+        Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+        a solution, found by depth-first search in parallel.  Return None
+        if this is not possible.
+
+        The workers' counts are added to stats once they stop, but
+        stats.callback only sees the puzzles expanded in this process.
+        Likewise a node budget only counts those puzzles, while time
+        and cancel are checked every tenth of a second throughout.
+
+        @type self: ParallelDepthFirstSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        is_solved, fail_fast, _, extensions = _probes(stats)
+        if is_solved(puzzle):
+            return build_path([puzzle])
+        if fail_fast(puzzle):
+            stats.pruned += 1
+            return None
+        # each path leads from puzzle to a live puzzle on the frontier
+        level, seen = [[puzzle]], {puzzle.state_key()}
+        for _ in range(self.depth):
+            if len(level) >= 4 * self.workers:
+                break
+            next_level = []
+            for path in level:
+                stats.expand(path[-1], len(level), len(seen),
+                             depth=len(path) - 1)
+                for child in extensions(path[-1]):
+                    stats.generated += 1
+                    key = child.state_key()
+                    if key in seen:
+                        stats.duplicates += 1
+                        continue
+                    seen.add(key)
+                    if is_solved(child):
+                        return build_path(path + [child])
+                    if not fail_fast(child):
+                        next_level.append(path + [child])
+                    else:
+                        stats.pruned += 1
+            level = next_level
+            if not level:
+                return None
+        context = multiprocessing.get_context()
+        tasks, results = context.Queue(), context.Queue()
+        stop = context.Event()
+        idle = context.Value("i", 0)
+        # pending counts tasks queued or being searched; the worker that
+        # takes it to 0 reports that the whole tree was searched
+        pending = context.Value("i", len(level))
+        processes = [context.Process(target=_search_subtrees,
+                                     args=(tasks, results, stop, idle,
+                                           pending, self.check,
+                                           stats.timed),
+                                     daemon=True)
+                     for _ in range(self.workers)]
+        # start the workers before the first put, since a fork while the
+        # queue's feeder thread holds its lock leaves the lock held
+        for process in processes:
+            process.start()
+        for path in level:
+            tasks.put((path, None))
+        reports = 0
+        try:
+            while True:
+                try:
+                    status, value = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any([p.is_alive() for p in processes]):
+                        raise RuntimeError("every search worker died")
+                    if stats.budget is not None:
+                        stats.budget.check(stats)
+                    continue
+                if status != "stats":
+                    break
+                stats.merge(value)
+                reports += 1
+        finally:
+            stop.set()
+            # each worker sends its counts as it stops
+            deadline = time.perf_counter() + 1
+            while reports < len(processes) and time.perf_counter() < deadline:
+                try:
+                    report, counters = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if report == "stats":
+                    stats.merge(counters)
+                    reports += 1
+            for process in processes:
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+            tasks.cancel_join_thread()
+        if status == "error":
+            raise RuntimeError("search worker failed: {}".format(value))
+        return build_path(value) if status == "solved" else None
+
+
+class BreadthFirstSolver(Solver):
+    """
+    Level-order search, which finds a shortest path to a solution.
+    """
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, found by breadth-first search.  Return
+        None if this is not possible.
+
+        @type self: BreadthFirstSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        is_solved, fail_fast, _, extensions = _probes(stats)
+        if is_solved(puzzle):
+            return build_path([puzzle])
+        # parent maps the key of each discovered puzzle to the key of the
+        # puzzle it was first reached from, so only one path is ever kept
+        start = puzzle.state_key()
+        parent = {start: None}
+        state = {start: puzzle}
+        frontier = deque([puzzle])
+        # the frontier holds the rest of the level at depth, level_left
+        # puzzles, followed by the start of the next level
+        depth, level_left = 0, 1
+        while frontier:
+            if not level_left:
+                depth, level_left = depth + 1, len(frontier)
+            level_left -= 1
+            current = frontier.popleft()
+            if fail_fast(current):
+                stats.pruned += 1
+                continue
+            stats.expand(current, len(frontier) + 1, len(parent),
+                         depth=depth)
+            current_key = current.state_key()
+            for child in extensions(current):
+                stats.generated += 1
+                key = child.state_key()
+                if key in parent:
+                    stats.duplicates += 1
+                    continue
+                parent[key], state[key] = current_key, child
+                if is_solved(child):
+                    return _trace_path(key, parent, state)
+                frontier.append(child)
+        return None
+
+
+class BidirectionalSolver(Solver):
+    """
+    Breadth-first search from both the puzzle and its solution at once,
+    stopping where the two searches meet.  Only for puzzles that
+    implement reversed, whose moves can all be undone.
+    """
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, found by bidirectional breadth-first
+        search.  Return None if this is not possible.
+
+        @type self: BidirectionalSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        is_solved, fail_fast, _, _ = _probes(stats)
+        if is_solved(puzzle):
+            return build_path([puzzle])
+        goal = puzzle.reversed()
+        if fail_fast(goal):
+            # no solution for the search from the goal to start at
+            stats.pruned += 1
+            return None
+        start_key, goal_key = puzzle.state_key(), goal.state_key()
+        # index 0 is the search from puzzle, index 1 the search from goal
+        frontiers = [deque([puzzle]), deque([goal])]
+        parents = [{start_key: None}, {goal_key: None}]
+        depths = [{start_key: 0}, {goal_key: 0}]
+        state = {start_key: puzzle}
+        while frontiers[0] and frontiers[1]:
+            # grow whichever search has the smaller frontier by one level
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            meeting = self._expand_level(frontiers[side], parents[side],
+                                         depths[side], depths[1 - side],
+                                         state if side == 0 else None,
+                                         stats)
+            stats.peak_frontier = max(stats.peak_frontier,
+                                      len(frontiers[0]) + len(frontiers[1]))
+            stats.peak_visited = max(stats.peak_visited,
+                                     len(parents[0]) + len(parents[1]))
+            if meeting is not None:
+                return self._join(meeting, parents, state)
+        return None
+
+    def _expand_level(self, frontier, parent, depth, other_depth, state,
+                      stats):
+        # Expand every puzzle of the deepest level in frontier, recording
+        # parent and depth of each new key, and state of each new puzzle
+        # unless state is None.  Return the new key that lies on the
+        # shortest path found through other_depth, or None if no new key
+        # is in other_depth.  The work done is counted in stats, with
+        # the states of both searches as those remembered, so that a
+        # budget on them is checked at every expansion.
+        #
+        # @type self: BidirectionalSolver
+        # @type frontier: deque[Puzzle]
+        # @type parent: dict[Hashable, Hashable | None]
+        # @type depth: dict[Hashable, int]
+        # @type other_depth: dict[Hashable, int]
+        # @type state: dict[Hashable, Puzzle] | None
+        # @type stats: SearchStats
+        # @rtype: Hashable | None
+        _, fail_fast, _, extensions = _probes(stats)
+        meeting, best = None, None
+        for _ in range(len(frontier)):
+            current = frontier.popleft()
+            if fail_fast(current):
+                stats.pruned += 1
+                continue
+            current_key = current.state_key()
+            # only the search from the puzzle gets any closer to solving it
+            stats.expand(current, len(frontier) + 1,
+                         len(parent) + len(other_depth),
+                         depth=(None if state is None else
+                                depth[current_key]))
+            child_depth = depth[current_key] + 1
+            for child in extensions(current):
+                stats.generated += 1
+                key = child.state_key()
+                if key in parent:
+                    stats.duplicates += 1
+                    continue
+                parent[key], depth[key] = current_key, child_depth
+                if state is not None:
+                    state[key] = child
+                if key in other_depth:
+                    # keep scanning the level: a later meeting may be
+                    # shallower on the other side
+                    total = child_depth + other_depth[key]
+                    if best is None or total < best:
+                        meeting, best = key, total
+                frontier.append(child)
+        return meeting
+
+    def _join(self, meeting, parents, state):
+        # Return the path through the key meeting, made of the forward
+        # search's puzzles up to meeting and then the extensions that
+        # retrace the backward search's keys from meeting to the goal,
+        # or None if some step of those can't be retraced or the path
+        # doesn't end in a solution.
+        #
+        # @type self: BidirectionalSolver
+        # @type meeting: Hashable
+        # @type parents: list[dict[Hashable, Hashable | None]]
+        # @type state: dict[Hashable, Puzzle]
+        # @rtype: PuzzleNode | None
+        path, key = [], meeting
+        while key is not None:
+            path.append(state[key])
+            key = parents[0][key]
+        path.reverse()
+        key = parents[1][meeting]
+        while key is not None:
+            step = next((child for child in path[-1].iter_extensions()
+                         if child.state_key() == key), None)
+            if step is None:
+                return None
+            path.append(step)
+            key = parents[1][key]
+        return build_path(path) if path[-1].is_solved() else None
+
+
+class ExternalBreadthFirstSolver(Solver):
+    """
+    Breadth-first search that keeps its levels on disk rather than in
+    memory, so that it can search state spaces too large to remember.
+    Only for puzzles that implement pack_state and unpack_state.
+
+    Each level is a file of the sorted, distinct packed states of its
+    puzzles.  Expanding a level streams its file back in and buffers
+    the packed extensions, which are written out as a sorted run each
+    time the buffer fills.  The runs are then merged into the file of
+    the next level, dropping duplicates and the states of earlier
+    levels as they go.
+    """
+
+    def __init__(self, directory=None, memory=2 ** 20, locality=None):
+        """
+        Create a new ExternalBreadthFirstSolver self that keeps its
+        files in a temporary directory under directory, or under the
+        system's temporary directory if directory is None, and buffers
+        at most memory packed states at a time.
+
+        If locality is not None, no move leads back more than locality
+        levels, and only that many earlier levels are merged against:
+        2 will do for puzzles whose moves can all be undone, and 1 for
+        puzzles like peg solitaire whose moves never lead back at all.
+
+        @type self: ExternalBreadthFirstSolver
+        @type directory: str | None
+        @type memory: int
+        @type locality: int | None
+        @rtype: None
+        """
+        self.directory, self.memory = directory, memory
+        self.locality = locality
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, found by breadth-first search with the
+        levels on disk.  Return None if this is not possible.
+
+        @type self: ExternalBreadthFirstSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        if _probes(stats)[0](puzzle):
+            return build_path([puzzle])
+        with tempfile.TemporaryDirectory(dir=self.directory) as work:
+            for depth, found in self._levels(puzzle, work, stats, True):
+                if found is not None:
+                    return self._path(puzzle, work, depth, found, stats)
+        return None
+
+    def level_sizes(self, puzzle, stats=None):
+        """
+        Return the number of distinct states at each number of moves
+        from puzzle, starting with 1 for puzzle itself, by breadth-first
+        search of everything reachable from puzzle.  If stats is not
+        None, add the work done to it.
+
+        >>> from grid_peg_solitaire_puzzle import GridPegSolitairePuzzle
+        >>> p = GridPegSolitairePuzzle([["*", "*", "."]], {"*", "."})
+        >>> ExternalBreadthFirstSolver().level_sizes(p)
+        [1, 1]
+
+        @type self: ExternalBreadthFirstSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats | None
+        @rtype: list[int]
+        """
+        if stats is None:
+            stats = SearchStats(timed=False)
+        sizes = [1]
+        with tempfile.TemporaryDirectory(dir=self.directory) as work:
+            for depth, _ in self._levels(puzzle, work, stats, False):
+                sizes.append(os.path.getsize(_level_path(work, depth)) //
+                             len(puzzle.pack_state()))
+        # the search ends by finding the last level empty
+        return sizes[:-1]
+
+    def _levels(self, puzzle, work, stats, solving):
+        # Write the files of the levels of the search from puzzle to
+        # work, yielding (depth, found) after the one at each depth
+        # from 1 on, where found is None or, if solving, the packed
+        # state of a solution at depth, at which point the level is
+        # left unfinished.  Stop once a level is empty.
+        #
+        # @type self: ExternalBreadthFirstSolver
+        # @type puzzle: Puzzle
+        # @type work: str
+        # @type stats: SearchStats
+        # @type solving: bool
+        # @rtype: iterator[(int, bytes | None)]
+        is_solved, fail_fast, _, extensions = _probes(stats)
+        size = len(puzzle.pack_state())
+        _write_run(_level_path(work, 0), [puzzle.pack_state()])
+        depth, level_size = 0, 1
+        while level_size:
+            runs, buffer, generated = [], [], 0
+            for key in _read_records(_level_path(work, depth), size):
+                current = puzzle.unpack_state(key)
+                if fail_fast(current):
+                    stats.pruned += 1
+                    continue
+                stats.expand(current, level_size, len(buffer),
+                             depth=depth)
+                for child in extensions(current):
+                    generated += 1
+                    if solving and is_solved(child):
+                        stats.generated += generated
+                        yield depth + 1, child.pack_state()
+                        return
+                    buffer.append(child.pack_state())
+                    if len(buffer) >= self.memory:
+                        runs.append(self._spill(work, len(runs), buffer))
+                        buffer = []
+            if buffer:
+                runs.append(self._spill(work, len(runs), buffer))
+            stats.generated += generated
+            depth += 1
+            first = 0 if self.locality is None else depth - self.locality
+            earlier = [_level_path(work, d)
+                       for d in range(max(first, 0), depth)]
+            # merging too many runs at once would run out of open files,
+            # so they are merged a group at a time into longer ones
+            while len(runs) > _MERGE_WIDTH:
+                merged = os.path.join(work, "run-{}-{}".format(depth,
+                                                               len(runs)))
+                _merge_runs(merged, runs[:_MERGE_WIDTH], [], size)
+                runs = runs[_MERGE_WIDTH:] + [merged]
+            level_size = _merge_runs(_level_path(work, depth), runs,
+                                     earlier, size)
+            stats.duplicates += generated - level_size
+            yield depth, None
+
+    def _spill(self, work, number, buffer):
+        # Write the distinct keys of buffer to work, sorted, as the run
+        # numbered number, and return the path of the run.
+        #
+        # @type self: ExternalBreadthFirstSolver
+        # @type work: str
+        # @type number: int
+        # @type buffer: list[bytes]
+        # @rtype: str
+        path = os.path.join(work, "run-{}".format(number))
+        _write_run(path, sorted(set(buffer)))
+        return path
+
+    def _path(self, puzzle, work, depth, found, stats):
+        # Return the path from puzzle to the solution packed into found,
+        # depth moves away.  The packed state of each puzzle on it is
+        # found in turn, from the solution back, by looking for one in
+        # the level before with an extension that packs to the last
+        # found; the path is then retraced with puzzle's own extensions.
+        #
+        # @type self: ExternalBreadthFirstSolver
+        # @type puzzle: Puzzle
+        # @type work: str
+        # @type depth: int
+        # @type found: bytes
+        # @type stats: SearchStats
+        # @rtype: PuzzleNode
+        _, _, _, extensions = _probes(stats)
+        size, keys = len(found), [found]
+        for d in range(depth - 1, 0, -1):
+            for key in _read_records(_level_path(work, d), size):
+                if any([child.pack_state() == keys[-1] for child in
+                        extensions(puzzle.unpack_state(key))]):
+                    keys.append(key)
+                    break
+        path = [puzzle]
+        for key in reversed(keys):
+            path.append(next(child for child in path[-1].iter_extensions()
+                             if child.pack_state() == key))
+        return build_path(path)
+
+
+class AStarSolver(Solver):
+    """
+    Best-first search on moves made plus a heuristic estimate of the
+    moves left, which finds a shortest path whenever the heuristic
+    never overestimates.
+    """
+
+    def __init__(self, heuristic=None):
+        """
+        Create a new AStarSolver self that estimates the moves left
+        with heuristic, or with each puzzle's own heuristic method if
+        heuristic is None.
+
+        @type self: AStarSolver
+        @type heuristic: (Puzzle) -> int | None
+        @rtype: None
+        """
+        self.heuristic = heuristic or _puzzle_heuristic
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, found by A* search.  Return None if this
+        is not possible.
+
+        @type self: AStarSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        is_solved, fail_fast, _, extensions = _probes(stats)
+        heuristic, tie = self.heuristic, count()
+        start = puzzle.state_key()
+        parent, state, cost = {start: None}, {start: puzzle}, {start: 0}
+        # entries are (estimated total, -moves made, tie, key); among
+        # equal estimates the deepest puzzle is expanded first
+        frontier = [(heuristic(puzzle), 0, next(tie), start)]
+        while frontier:
+            total, moves, _, key = heappop(frontier)
+            moves = -moves
+            if moves > cost[key]:
+                # stale entry for a puzzle since reached more cheaply
+                continue
+            current = state[key]
+            if is_solved(current):
+                return _trace_path(key, parent, state)
+            if fail_fast(current):
+                stats.pruned += 1
+                continue
+            stats.expand(current, len(frontier) + 1, len(cost), depth=moves,
+                         estimate=total - moves)
+            moves += 1
+            for child in extensions(current):
+                stats.generated += 1
+                child_key = child.state_key()
+                if cost.get(child_key, moves + 1) <= moves:
+                    stats.duplicates += 1
+                    continue
+                parent[child_key], state[child_key] = key, child
+                cost[child_key] = moves
+                heappush(frontier, (moves + heuristic(child), -moves,
+                                    next(tie), child_key))
+        return None
+
+
+class IDAStarSolver(Solver):
+    """
+    Iterative-deepening A*: repeated depth-first searches bounded by
+    moves made plus a heuristic estimate, raising the bound each round.
+    Memory use is proportional to the length of the path only.  Puzzles
+    that can apply and undo their moves are searched as one copy,
+    changed in place.
+    """
+
+    def __init__(self, heuristic=None):
+        """
+        Create a new IDAStarSolver self that estimates the moves left
+        with heuristic, or with each puzzle's own heuristic method if
+        heuristic is None.
+
+        @type self: IDAStarSolver
+        @type heuristic: (Puzzle) -> int | None
+        @rtype: None
+        """
+        self.heuristic = heuristic or _puzzle_heuristic
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, found by IDA* search.  Return None if
+        this is not possible.
+
+        @type self: IDAStarSolver
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        if _probes(stats)[0](puzzle):
+            return build_path([puzzle])
+        bound = self.heuristic(puzzle)
+        in_place = _in_place(puzzle)
+        while bound is not None:
+            if in_place:
+                made, bound = self._bounded_search_in_place(puzzle, bound,
+                                                            stats)
+                path = None if made is None else _replay(puzzle, made)
+            else:
+                path, bound = self._bounded_search(puzzle, bound, stats)
+            if path is not None:
+                return build_path(path)
+        return None
+
+    def _bounded_search(self, puzzle, bound, stats):
+        # Return (path, None) for a path to a solution whose estimated
+        # total stays within bound, or (None, next bound) where the next
+        # bound is the smallest estimate that exceeded bound, or None if
+        # nothing did.  The work done is counted in stats.
+        #
+        # @type self: IDAStarSolver
+        # @type puzzle: Puzzle
+        # @type bound: int
+        # @type stats: SearchStats
+        # @rtype: (list[Puzzle] | None, int | None)
+        is_solved, fail_fast, iter_extensions, _ = _probes(stats)
+        heuristic, next_bound = self.heuristic, None
+        if fail_fast(puzzle):
+            stats.pruned += 1
+            return None, None
+        path, keys = [puzzle], [puzzle.state_key()]
+        on_path = set(keys)
+        children = [iter_extensions(puzzle)]
+        stats.expand(puzzle, 1, 1, depth=0, estimate=heuristic(puzzle))
+        while children:
+            child = next(children[-1], None)
+            if child is None:
+                children.pop()
+                path.pop()
+                on_path.discard(keys.pop())
+                continue
+            stats.generated += 1
+            key = child.state_key()
+            if key in on_path:
+                stats.duplicates += 1
+                continue
+            left = heuristic(child)
+            estimate = len(path) + left
+            if estimate > bound:
+                if next_bound is None or estimate < next_bound:
+                    next_bound = estimate
+                continue
+            if is_solved(child):
+                path.append(child)
+                return path, None
+            if not fail_fast(child):
+                path.append(child)
+                keys.append(key)
+                on_path.add(key)
+                children.append(iter_extensions(child))
+                stats.expand(child, len(children), len(on_path),
+                             depth=len(path) - 1, estimate=left)
+            else:
+                stats.pruned += 1
+        return None, next_bound
+
+    def _bounded_search_in_place(self, puzzle, bound, stats):
+        # Return what _bounded_search returns, but with the moves of the
+        # path rather than its puzzles, searching a copy of puzzle by
+        # applying and undoing its moves.
+        #
+        # @type self: IDAStarSolver
+        # @type puzzle: Puzzle
+        # @type bound: int
+        # @type stats: SearchStats
+        # @rtype: (list[Hashable] | None, int | None)
+        is_solved, fail_fast, _, _ = _probes(stats)
+        heuristic, next_bound = self.heuristic, None
+        if fail_fast(puzzle):
+            stats.pruned += 1
+            return None, None
+        state = puzzle.copy()
+        moves, apply, undo = _move_probes(stats, state)
+        made, keys = [], [state.state_key()]
+        on_path = set(keys)
+        pending = [iter(moves())]
+        stats.expand(state, 1, 1, depth=0, estimate=heuristic(state))
+        while pending:
+            move = next(pending[-1], None)
+            if move is None:
+                pending.pop()
+                on_path.discard(keys.pop())
+                if made:
+                    undo(made.pop())
+                continue
+            apply(move)
+            stats.generated += 1
+            key = state.state_key()
+            if key in on_path:
+                stats.duplicates += 1
+                undo(move)
+                continue
+            left = heuristic(state)
+            estimate = len(pending) + left
+            if estimate > bound:
+                if next_bound is None or estimate < next_bound:
+                    next_bound = estimate
+                undo(move)
+                continue
+            if is_solved(state):
+                made.append(move)
+                return made, None
+            if not fail_fast(state):
+                made.append(move)
+                keys.append(key)
+                on_path.add(key)
+                pending.append(iter(moves()))
+                stats.expand(state, len(pending), len(on_path),
+                             depth=len(made), estimate=left)
+            else:
+                stats.pruned += 1
+                undo(move)
+        return None, next_bound
 
 
-dfs_visited = set()
 def depth_first_solve(puzzle):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
@@ -22,56 +1201,655 @@ def depth_first_solve(puzzle):
     @type puzzle: Puzzle
     @rtype: PuzzleNode
     """
-    global dfs_visited
-    if str(puzzle) in dfs_visited:
-        return None
-    elif puzzle.is_solved():
-        final = PuzzleNode(puzzle, [], None)
-        dfs_visited.clear()
-        return final
-    else:
-        dfs_visited.add(str(puzzle))
-        children = puzzle.extensions()
-        for child in children:
-            next_recur = depth_first_solve(child)
-            if next_recur is None:
-                continue
-            else:
-                return PuzzleNode(puzzle, [next_recur], None)
+    return DepthFirstSolver().solve(puzzle)
+
+
+def parallel_depth_first_solve(puzzle, workers=None, depth=2):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+    a solution, found by depth-first search on workers processes, or one
+    per CPU if workers is None, splitting the search depth moves below
+    puzzle.  Return None if this is not possible.
+
+    @type puzzle: Puzzle
+    @type workers: int | None
+    @type depth: int
+    @rtype: PuzzleNode | None
+    """
+    return ParallelDepthFirstSolver(workers, depth).solve(puzzle)
+
 
-bfs_visited = []
 def breadth_first_solve(puzzle):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
     a solution, with each child PuzzleNode containing an extension
     of the puzzle in its parent.  Return None if this is not possible.
 
+    The path returned is a shortest one, since puzzles are expanded
+    level by level.
+
     @type puzzle: Puzzle
     @rtype: PuzzleNode
     """
-    global bfs_visited
-    if puzzle in bfs_visited:
-        return None
-    elif puzzle.is_solved():
-        final = PuzzleNode(puzzle, [], None)
-        bfs_visited.clear()
-        return final
-    else:
-        bfs_visited.append(puzzle)
-        children = puzzle.extensions()
-        for child in children:
-            if child.is_solved():
-                final = PuzzleNode(puzzle, [child], None)
-                return final
-            bfs_visited.append(child)
-        for child in children:
-            grandchildren = child.extensions()
-            for grandchild in grandchildren:
-                next_recur = breadth_first_solve(grandchild)
-                if next_recur is None:
+    return BreadthFirstSolver().solve(puzzle)
+
+
+def bidirectional_solve(puzzle):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, searching from puzzle and from its solution
+    until the two searches meet.  Return None if this is not possible.
+
+    Precondition: puzzle implements reversed.
+
+    @type puzzle: Puzzle
+    @rtype: PuzzleNode
+    """
+    return BidirectionalSolver().solve(puzzle)
+
+
+def external_breadth_first_solve(puzzle, directory=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, found by breadth-first search with the
+    levels kept in files under directory, or under the system's
+    temporary directory if directory is None.  Return None if this is
+    not possible.
+
+    Precondition: puzzle implements pack_state and unpack_state.
+
+    @type puzzle: Puzzle
+    @type directory: str | None
+    @rtype: PuzzleNode
+    """
+    return ExternalBreadthFirstSolver(directory).solve(puzzle)
+
+
+def astar_solve(puzzle, heuristic=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, found by A* search with heuristic, or with
+    puzzle's own heuristic method if heuristic is None.  Return None if
+    this is not possible.
+
+    @type puzzle: Puzzle
+    @type heuristic: (Puzzle) -> int | None
+    @rtype: PuzzleNode
+    """
+    return AStarSolver(heuristic).solve(puzzle)
+
+
+def ida_star_solve(puzzle, heuristic=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, found by IDA* search with heuristic, or with
+    puzzle's own heuristic method if heuristic is None.  Return None if
+    this is not possible.
+
+    @type puzzle: Puzzle
+    @type heuristic: (Puzzle) -> int | None
+    @rtype: PuzzleNode
+    """
+    return IDAStarSolver(heuristic).solve(puzzle)
+
+
+# strategies solve_many accepts by name
+SOLVERS = {"depth_first": DepthFirstSolver,
+           "breadth_first": BreadthFirstSolver,
+           "bidirectional": BidirectionalSolver,
+           "external_breadth_first": ExternalBreadthFirstSolver,
+           "astar": AStarSolver,
+           "ida_star": IDAStarSolver}
+
+
+def solve_many(puzzles, strategy="depth_first", workers=None, timeout=None):
+    """
+    Solve each of puzzles on a pool of workers worker processes, or one
+    per CPU if workers is None, and yield (index, result, stats) as
+    each solve finishes, in order of completion.
+
+    index is the position of the puzzle in puzzles, and result the path
+    strategy returned, or None.  strategy is a Solver or a key of
+    SOLVERS.  stats is a dict whose "status" is "solved", "unsolvable",
+    "timeout" (after timeout seconds, if timeout is not None) or
+    "error", whose "error" describes any error, and whose "seconds" is
+    the time the solve took.  Its other entries are the counters of a
+    SearchStats for the solve, all 0 if the worker process died.  A
+    puzzle that times out, raises, or takes its worker process down
+    with it doesn't stop the others: when a worker dies, the puzzles in
+    flight on the pool are run again, each in a pool of its own, and
+    only one that takes that pool down too is reported as an error.
+
+    Solves check for timeouts as they expand each puzzle.  Those that
+    don't expand puzzles one by one, such as dancing links, are stopped
+    by SIGALRM a second after timing out, on unix platforms only.
+
+    @type puzzles: iterable[Puzzle]
+    @type strategy: Solver | str
+    @type workers: int | None
+    @type timeout: float | None
+    @rtype: generator[(int, PuzzleNode | None, dict)]
+    """
+    solver = SOLVERS[strategy]() if isinstance(strategy, str) else strategy
+    workers = workers or os.cpu_count() or 1
+    pending = enumerate(puzzles)
+    # in_flight maps each future to (index, puzzle, alone, start), where
+    # alone is the single-worker pool of a suspect puzzle run on its
+    # own, or None for a puzzle on the shared pool
+    in_flight, suspects = {}, []
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            running_alone = len([entry for entry in in_flight.values()
+                                 if entry[2] is not None])
+            while suspects and running_alone < workers:
+                index, puzzle = suspects.pop()
+                alone = ProcessPoolExecutor(max_workers=1)
+                future = alone.submit(_solve_one, solver, puzzle, timeout)
+                in_flight[future] = (index, puzzle, alone,
+                                     time.perf_counter())
+                running_alone += 1
+            # keep a few puzzles queued per worker, so that puzzles may
+            # come from a generator without all being pickled up front
+            while len(in_flight) - running_alone < 2 * workers:
+                index, puzzle = next(pending, (None, None))
+                if index is None:
+                    break
+                future = pool.submit(_solve_one, solver, puzzle, timeout)
+                in_flight[future] = (index, puzzle, None, time.perf_counter())
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                index, puzzle, alone, start = in_flight.pop(future)
+                if alone is not None:
+                    alone.shutdown(wait=False)
+                try:
+                    path, stats = future.result()
+                except BrokenProcessPool as error:
+                    if alone is None:
+                        # some worker died, failing every puzzle in flight
+                        # on the pool; only running each on its own shows
+                        # which one took it down
+                        broken = True
+                        suspects.append((index, puzzle))
+                        continue
+                    path = None
+                    stats = _failure(error, time.perf_counter() - start)
+                except Exception as error:
+                    path = None
+                    stats = _failure(error, time.perf_counter() - start)
+                yield index, (build_path(path) if path else None), stats
+            if broken:
+                for future, entry in list(in_flight.items()):
+                    if entry[2] is None:
+                        suspects.append(entry[:2])
+                        del in_flight[future]
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for _, _, alone, _ in in_flight.values():
+            if alone is not None:
+                alone.shutdown(wait=False, cancel_futures=True)
+
+
+def _failure(error, seconds):
+    """
+    Return the solve_many stats of a solve that failed with error after
+    seconds seconds.
+
+    @type error: Exception
+    @type seconds: float
+    @rtype: dict
+    """
+    stats = SearchStats().as_dict()
+    stats.update({"status": "error", "error": repr(error),
+                  "seconds": seconds})
+    return stats
+
+
+class _SolveTimeout(Exception):
+    """
+    Raised inside a solve_many worker when its solve runs out of time.
+    """
+
+
+def _raise_timeout(signum, frame):
+    """
+    Signal handler that interrupts a solve_many worker's solve.
+
+    @type signum: int
+    @type frame: frame
+    @rtype: None
+    """
+    raise _SolveTimeout()
+
+
+def _solve_one(solver, puzzle, timeout):
+    """
+    Return the puzzles along the path solver finds from puzzle, or
+    None, with the stats solve_many reports.  The path is returned as a
+    flat list, since pickling a long chain of PuzzleNodes recurses once
+    per node.
+
+    @type solver: Solver
+    @type puzzle: Puzzle
+    @type timeout: float | None
+    @rtype: (list[Puzzle] | None, dict)
+    """
+    budget = None if timeout is None else Budget(seconds=timeout)
+    # the alarm only stops solves that never check their budget
+    alarm = timeout is not None and hasattr(signal, "setitimer")
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout + 1)
+    start = time.perf_counter()
+    path, error, search = None, None, SearchStats()
+    try:
+        node = solver.solve(puzzle, search, budget)
+        status = "unsolvable" if node is None else "solved"
+        if node is not None:
+            path = node.puzzles()
+    except (BudgetExceeded, _SolveTimeout):
+        status = "timeout"
+    except Exception as e:
+        status, error = "error", repr(e)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    stats = search.as_dict()
+    stats.update({"status": status, "error": error,
+                  "seconds": time.perf_counter() - start})
+    return path, stats
+
+
+def _search_subtrees(tasks, results, stop, idle, pending, check, timed):
+    """
+    Search the subtrees of ParallelDepthFirstSolver tasks until stop is
+    set, reporting on results, and then report the work done, timing
+    the puzzle methods if timed.
+
+    A task (path, children) stands for the extensions children of the
+    last puzzle on path, or all its extensions if children is None.
+    idle counts the workers waiting for a task, and pending the tasks
+    not yet searched to the end.
+
+    @type tasks: multiprocessing.Queue
+    @type results: multiprocessing.Queue
+    @type stop: multiprocessing.Event
+    @type idle: multiprocessing.Value
+    @type pending: multiprocessing.Value
+    @type check: int
+    @type timed: bool
+    @rtype: None
+    """
+    stats = SearchStats(timed=timed)
+    is_solved, fail_fast, iter_extensions, _ = _probes(stats)
+    # a worker only stops once the search is over, so tasks it shared
+    # and nobody took needn't hold up its exit
+    tasks.cancel_join_thread()
+    # every key met by this worker is searched to the end by it, or by
+    # whichever worker it gave that part of the search to
+    seen = set()
+    try:
+        while not stop.is_set():
+            with idle.get_lock():
+                idle.value += 1
+            try:
+                path, children = tasks.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            finally:
+                with idle.get_lock():
+                    idle.value -= 1
+            path = list(path)
+            if children is None:
+                children = iter_extensions(path[-1])
+                stats.expand(path[-1], 1, len(seen), depth=len(path) - 1)
+            # as in DepthFirstSolver.solve, but with an iterator only for
+            # the puzzles below path[:base]
+            base = len(path) - 1
+            stack, steps = [iter(children)], 0
+            while stack and not stop.is_set():
+                steps += 1
+                if steps % check == 0 and idle.value and tasks.empty():
+                    _share(path, stack, base, tasks, pending)
+                child = next(stack[-1], None)
+                if child is None:
+                    stack.pop()
+                    path.pop()
+                    continue
+                stats.generated += 1
+                key = child.state_key()
+                if key in seen:
+                    stats.duplicates += 1
                     continue
+                seen.add(key)
+                if is_solved(child):
+                    results.put(("solved", path + [child]))
+                    return
+                if not fail_fast(child):
+                    path.append(child)
+                    stack.append(iter_extensions(child))
+                    stats.expand(child, len(stack), len(seen),
+                                 depth=len(path) - 1)
                 else:
-                    return PuzzleNode(child, [next_recur], None)
+                    stats.pruned += 1
+            if stop.is_set():
+                return
+            with pending.get_lock():
+                pending.value -= 1
+                if pending.value == 0:
+                    results.put(("unsolvable", None))
+                    return
+    except Exception as e:
+        results.put(("error", repr(e)))
+    finally:
+        results.put(("stats", stats.as_dict()))
+
+
+def _share(path, stack, base, tasks, pending):
+    """
+    Queue the larger half of the shallowest unexplored extensions on
+    stack as a new task, keeping the rest.  stack[i] holds the
+    unexplored extensions of path[base + i].
+
+    @type path: list[Puzzle]
+    @type stack: list[iterator[Puzzle]]
+    @type base: int
+    @type tasks: multiprocessing.Queue
+    @type pending: multiprocessing.Value
+    @rtype: None
+    """
+    for i in range(len(stack)):
+        rest = list(stack[i])
+        half = len(rest) // 2
+        # keep at least one puzzle to search, so that work can't be
+        # passed back and forth without any of it being done
+        if rest[half:] and (half or i < len(stack) - 1):
+            with pending.get_lock():
+                pending.value += 1
+            tasks.put((path[:base + i + 1], rest[half:]))
+            stack[i] = iter(rest[:half])
+            return
+        stack[i] = iter(rest)
+
+
+def _probes(stats):
+    """
+    Return functions that call the is_solved, fail_fast,
+    iter_extensions and extensions methods of a puzzle, adding the time
+    each call takes to stats if stats.timed.
+
+    @type stats: SearchStats
+    @rtype: ((Puzzle) -> bool, (Puzzle) -> bool,
+             (Puzzle) -> iterator[Puzzle], (Puzzle) -> list[Puzzle])
+    """
+    if not stats.timed:
+        return _is_solved, _fail_fast, _iter_extensions, _extensions
+    clock = time.perf_counter
+
+    def is_solved(puzzle):
+        start = clock()
+        result = puzzle.is_solved()
+        stats.is_solved_seconds += clock() - start
+        return result
+
+    def fail_fast(puzzle):
+        start = clock()
+        result = puzzle.fail_fast()
+        stats.fail_fast_seconds += clock() - start
+        return result
+
+    def iter_extensions(puzzle):
+        children = puzzle.iter_extensions()
+        while True:
+            start = clock()
+            child = next(children, None)
+            stats.extensions_seconds += clock() - start
+            if child is None:
+                return
+            yield child
+
+    def extensions(puzzle):
+        start = clock()
+        result = puzzle.extensions()
+        stats.extensions_seconds += clock() - start
+        return result
+
+    return is_solved, fail_fast, iter_extensions, extensions
+
+
+# whether each puzzle class met can be searched in place
+_in_place_classes = {}
+
+
+def _in_place(puzzle):
+    """
+    Return whether puzzle can be searched by applying and undoing its
+    moves, because its class overrides moves, apply, undo and copy.
+
+    @type puzzle: Puzzle
+    @rtype: bool
+    """
+    cls = type(puzzle)
+    if cls not in _in_place_classes:
+        _in_place_classes[cls] = all([
+            getattr(cls, name) is not getattr(Puzzle, name)
+            for name in ("moves", "apply", "undo", "copy")])
+    return _in_place_classes[cls]
+
+
+def _move_probes(stats, state):
+    """
+    Return the moves, apply and undo methods of state, as functions that
+    add the time each call takes to stats.extensions_seconds if
+    stats.timed.
+
+    @type stats: SearchStats
+    @type state: Puzzle
+    @rtype: (() -> list[Hashable], (Hashable) -> None,
+             (Hashable) -> None)
+    """
+    if not stats.timed:
+        return state.moves, state.apply, state.undo
+    clock = time.perf_counter
+
+    def timed(method):
+        def call(*args):
+            start = clock()
+            result = method(*args)
+            stats.extensions_seconds += clock() - start
+            return result
+        return call
+
+    return timed(state.moves), timed(state.apply), timed(state.undo)
+
+
+def _replay(puzzle, moves):
+    """
+    Return the puzzles met by making moves in turn from puzzle, starting
+    with puzzle itself, each a copy of its own.
+
+    @type puzzle: Puzzle
+    @type moves: list[Hashable]
+    @rtype: list[Puzzle]
+    """
+    path = [puzzle]
+    for move in moves:
+        path.append(path[-1].copy())
+        path[-1].apply(move)
+    return path
+
+
+def _is_solved(puzzle):
+    """
+    Return whether puzzle is solved.
+
+    @type puzzle: Puzzle
+    @rtype: bool
+    """
+    return puzzle.is_solved()
+
+
+def _fail_fast(puzzle):
+    """
+    Return whether puzzle can never be extended to a solution.
+
+    @type puzzle: Puzzle
+    @rtype: bool
+    """
+    return puzzle.fail_fast()
+
+
+def _iter_extensions(puzzle):
+    """
+    Return an iterator over the extensions of puzzle.
+
+    @type puzzle: Puzzle
+    @rtype: iterator[Puzzle]
+    """
+    return puzzle.iter_extensions()
+
+
+def _extensions(puzzle):
+    """
+    Return a list of the extensions of puzzle.
+
+    @type puzzle: Puzzle
+    @rtype: list[Puzzle]
+    """
+    return puzzle.extensions()
+
+
+def _puzzle_heuristic(puzzle):
+    """
+    Return puzzle's own estimate of the moves left to a solution.
+
+    @type puzzle: Puzzle
+    @rtype: int
+    """
+    return puzzle.heuristic()
+
+
+def _trace_path(key, parent, state):
+    """
+    Return the first PuzzleNode of the path that ends at the puzzle with
+    state key key, following parent from each key to the key it was
+    reached from, and state from each key to its puzzle.
+
+    @type key: Hashable
+    @type parent: dict[Hashable, Hashable | None]
+    @type state: dict[Hashable, Puzzle]
+    @rtype: PuzzleNode
+    """
+    path = []
+    while key is not None:
+        path.append(state[key])
+        key = parent[key]
+    path.reverse()
+    return build_path(path)
+
+
+# runs merged at once by ExternalBreadthFirstSolver
+_MERGE_WIDTH = 64
+# records read or written by each file access
+_RECORDS_PER_BLOCK = 4096
+
+
+def _level_path(work, depth):
+    """
+    Return the path of the file of the level at depth in directory work.
+
+    @type work: str
+    @type depth: int
+    @rtype: str
+    """
+    return os.path.join(work, "level-{}".format(depth))
+
+
+def _read_records(path, size):
+    """
+    Yield the records of size bytes in the file at path, in order.
+
+    @type path: str
+    @type size: int
+    @rtype: iterator[bytes]
+    """
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(size * _RECORDS_PER_BLOCK)
+            if not block:
+                return
+            for i in range(0, len(block), size):
+                yield block[i:i + size]
+
+
+def _write_run(path, records):
+    """
+    Write records, one after another, to a new file at path.
+
+    @type path: str
+    @type records: list[bytes]
+    @rtype: None
+    """
+    with open(path, "wb") as f:
+        for i in range(0, len(records), _RECORDS_PER_BLOCK):
+            f.write(b"".join(records[i:i + _RECORDS_PER_BLOCK]))
+
+
+def _merge_runs(path, runs, earlier, size):
+    """
+    Write to path the distinct records, in order, of the files runs
+    that are in none of the files earlier, where every file holds
+    sorted, distinct records of size bytes.  Delete runs, and return
+    the number of records written.
+
+    @type path: str
+    @type runs: list[str]
+    @type earlier: list[str]
+    @type size: int
+    @rtype: int
+    """
+    old = merge(*[_read_records(p, size) for p in earlier])
+    seen, previous, block, written = next(old, None), None, [], 0
+    with open(path, "wb") as f:
+        for key in merge(*[_read_records(p, size) for p in runs]):
+            if key == previous:
+                continue
+            previous = key
+            while seen is not None and seen < key:
+                seen = next(old, None)
+            if key == seen:
+                continue
+            block.append(key)
+            if len(block) == _RECORDS_PER_BLOCK:
+                f.write(b"".join(block))
+                written, block = written + len(block), []
+        f.write(b"".join(block))
+    for p in runs:
+        os.remove(p)
+    return written + len(block)
+
+
+def build_path(puzzles):
+    """
+    Return the first PuzzleNode of a chain through puzzles, where each
+    node has the next one as its only child.
+
+    @type puzzles: list[Puzzle]
+    @rtype: PuzzleNode
+    """
+    root = PuzzleNode(puzzles[0])
+    node = root
+    for puzzle in puzzles[1:]:
+        child = PuzzleNode(puzzle, None, node)
+        node.children.append(child)
+        node = child
+    return root
 
 # Class PuzzleNode helps build trees of PuzzleNodes that have
 # an arbitrary number of children, and a parent.
@@ -79,8 +1857,14 @@ class PuzzleNode:
     """
     A Puzzle configuration that refers to other configurations that it
     can be extended to.
+
+    Solvers return paths as chains of PuzzleNodes, each with its next
+    node as its only child.  Chains may be thousands of nodes long, so
+    nothing here recurses along them.
     """
 
+    __slots__ = ("puzzle", "children", "parent")
+
     def __init__(self, puzzle=None, children=None, parent=None):
         """
         Create a new puzzle node self with configuration puzzle.
@@ -99,16 +1883,29 @@ class PuzzleNode:
 
     def __eq__(self, other):
         """
-        Return whether PuzzleNode self is equivalent to other
+        Return whether PuzzleNode self is equivalent to other: whether
+        they hold equal puzzles, and each child of one is equivalent to
+        some child of the other.
 
         @type self: PuzzleNode
         @type other: PuzzleNode | Any
         @rtype: bool
         """
-        return (type(self) == type(other) and
-                self.puzzle == other.puzzle and
-                all([x in self.children for x in other.children]) and
-                all([x in other.children for x in self.children]))
+        pairs = [(self, other)]
+        while pairs:
+            a, b = pairs.pop()
+            if type(a) != type(b) or a.puzzle != b.puzzle:
+                return False
+            if len(a.children) <= 1 and len(b.children) <= 1:
+                # the common case of a path: step along it
+                if len(a.children) != len(b.children):
+                    return False
+                if a.children:
+                    pairs.append((a.children[0], b.children[0]))
+            elif not (_covers(a.children, b.children) and
+                      _covers(b.children, a.children)):
+                return False
+        return True
 
     def __str__(self):
         """
@@ -116,5 +1913,74 @@ class PuzzleNode:
 
         # doctest not feasible.
         """
-        return "{}\n\n{}".format(self.puzzle,
-                                 "\n".join([str(x) for x in self.children]))
+        return "".join(self.render())
+
+    def render(self):
+        """
+        Yield the text of str(self) piece by piece, each puzzle followed
+        by those in its subtrees, so that a long path can be written out
+        without first building one string for all of it.
+
+        @type self: PuzzleNode
+        @rtype: generator[str]
+        """
+        yield str(self.puzzle)
+        yield "\n\n"
+        # each entry holds the children of a node still to be written,
+        # and whether one of them has been already
+        stack = [[iter(self.children), False]]
+        while stack:
+            entry = stack[-1]
+            child = next(entry[0], None)
+            if child is None:
+                stack.pop()
+                continue
+            if entry[1]:
+                yield "\n"
+            entry[1] = True
+            yield str(child.puzzle)
+            yield "\n\n"
+            stack.append([iter(child.children), False])
+
+    def puzzles(self):
+        """
+        Return the puzzles along the path that starts at PuzzleNode self
+        and goes on through the first child of each node.
+
+        @type self: PuzzleNode
+        @rtype: list[Puzzle]
+        """
+        path, node = [self.puzzle], self
+        while node.children:
+            node = node.children[0]
+            path.append(node.puzzle)
+        return path
+
+    def moves(self):
+        """
+        Return the moves along the path of puzzles(), as described by
+        each puzzle's move_to.
+
+        @type self: PuzzleNode
+        @rtype: list[Hashable]
+        """
+        path = self.puzzles()
+        return [a.move_to(b) for a, b in zip(path, path[1:])]
+
+
+def _covers(nodes, others):
+    """
+    Return whether every PuzzleNode in others is equivalent to some
+    PuzzleNode in nodes.
+
+    @type nodes: list[PuzzleNode]
+    @type others: list[PuzzleNode]
+    @rtype: bool
+    """
+    # only nodes whose puzzles hash alike can be equivalent
+    buckets = {}
+    for node in nodes:
+        buckets.setdefault(hash(node.puzzle), []).append(node)
+    return all([any([node == other
+                     for node in buckets.get(hash(other.puzzle), [])])
+                for other in others])
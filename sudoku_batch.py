@@ -0,0 +1,174 @@
+"""
+Constraint propagation on many SudokuPuzzles at once, with NumPy.
+
+Each board of a batch is a row of an array of candidate bitmasks, one
+per position, where symbol number k in sorted order is bit 1 << k, as
+in SudokuPuzzle.  Every round of propagation works on the whole batch:
+a position left with one candidate removes it from its row, column and
+subsquare, and a symbol with only one possible position in a row,
+column or subsquare is placed there.  Boards that propagation neither
+solves nor rules out are left to a per-board search.
+
+NumPy is only needed by this module, and only when it is used.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from sudoku_puzzle import SudokuPuzzle, DancingLinksSolver, _units
+
+
+def propagate_batch(puzzles, chunk=4096):
+    """
+    Return, for each of puzzles, the SudokuPuzzle with every symbol that
+    propagation forces filled in, or None if propagation shows it has no
+    solution.  Boards are propagated chunk at a time.
+
+    @type puzzles: list[SudokuPuzzle]
+    @type chunk: int
+    @rtype: list[SudokuPuzzle | None]
+    """
+    if numpy is None:
+        raise ImportError("propagate_batch needs NumPy")
+    results = [None] * len(puzzles)
+    # boards are batched with others of the same size and symbols
+    groups = {}
+    for k, puzzle in enumerate(puzzles):
+        groups.setdefault((puzzle._n, frozenset(puzzle._symbol_set)),
+                          []).append(k)
+    for (n, symbol_set), members in groups.items():
+        for start in range(0, len(members), chunk):
+            batch = members[start:start + chunk]
+            for k, symbols in zip(batch, _propagate(
+                    n, sorted(symbol_set),
+                    [puzzles[k]._symbols for k in batch])):
+                if symbols is not None:
+                    results[k] = SudokuPuzzle(n, symbols,
+                                              puzzles[k]._symbol_set)
+    return results
+
+
+def solve_batch(puzzles, fallback=None, chunk=4096):
+    """
+    Return, for each of puzzles, a solved SudokuPuzzle extending it, or
+    None if there isn't one.  Boards are propagated together, chunk at a
+    time, and only the boards propagation leaves undecided are solved
+    one at a time, by fallback, or by Dancing Links if fallback is None.
+
+    @type puzzles: list[SudokuPuzzle]
+    @type fallback: (SudokuPuzzle) -> SudokuPuzzle | None | None
+    @type chunk: int
+    @rtype: list[SudokuPuzzle | None]
+    """
+    if fallback is None:
+        fallback = DancingLinksSolver().solved
+    results = propagate_batch(puzzles, chunk)
+    for k, puzzle in enumerate(results):
+        if puzzle is not None and not puzzle.is_solved():
+            results[k] = fallback(puzzle)
+    return results
+
+
+def _propagate(n, symbols, boards):
+    """
+    Return the symbols of each board of boards, lists of n ** 2 symbols
+    from symbols or "*", with every symbol propagation forces filled in,
+    or None for a board propagation shows has no solution.
+
+    @type n: int
+    @type symbols: list[str]
+    @type boards: list[list[str]]
+    @rtype: list[list[str] | None]
+    """
+    dtype = numpy.uint16 if n <= 15 else numpy.uint64
+    full = (1 << n) - 1
+    code = {d: 1 << k for k, d in enumerate(symbols)}
+    code["*"] = full
+    candidates = numpy.array([[code[d] for d in board] for board in boards],
+                             dtype=dtype).reshape(len(boards), n * n)
+    units, cell_units = _unit_arrays(n)
+    dead = numpy.zeros(len(boards), dtype=bool)
+    # boards that changed in the last round, and so may change again
+    active = numpy.arange(len(boards))
+    while len(active):
+        before = candidates[active]
+        after, failed = _round(before, units, cell_units, full)
+        candidates[active] = after
+        dead[active[failed]] = True
+        changed = (after != before).any(axis=1) & ~failed
+        active = active[changed]
+    # each decided position holds a single bit, whose number is the
+    # index of its symbol
+    single = (candidates & (candidates - 1)) == 0
+    index = numpy.log2(numpy.maximum(candidates, 1)).astype(int)
+    table = numpy.array(symbols + ["*"])
+    decided = numpy.where(single, index, n)
+    return [None if dead[b] else table[decided[b]].tolist()
+            for b in range(len(boards))]
+
+
+def _round(candidates, units, cell_units, full):
+    """
+    Return the candidate bitmasks of the boards in candidates after one
+    round of propagation, and which boards turned out to have no
+    solution.  units and cell_units are as given by _unit_arrays, and
+    full has the bits of all symbols.
+
+    @type candidates: numpy.ndarray
+    @type units: numpy.ndarray
+    @type cell_units: numpy.ndarray
+    @type full: int
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    single = (candidates & (candidates - 1)) == 0
+    decided = numpy.where(single, candidates, 0)
+    # per board and unit, the symbols decided in it; distinct bits add
+    # up to their union, so a smaller union means a repeated symbol
+    in_units = decided[:, units]
+    used = numpy.bitwise_or.reduce(in_units, axis=2)
+    failed = (in_units.sum(axis=2, dtype=numpy.uint64) !=
+              used.astype(numpy.uint64)).any(axis=1)
+    # remove the symbols decided in each unit from the undecided
+    # positions of the unit
+    taken = numpy.bitwise_or.reduce(used[:, cell_units], axis=2)
+    candidates = numpy.where(single, candidates, candidates & ~taken)
+    # per board and unit, the symbols some position can hold, and those
+    # at least two positions can hold
+    once, twice = numpy.zeros_like(used), numpy.zeros_like(used)
+    for position in range(units.shape[1]):
+        column = candidates[:, units[:, position]]
+        twice |= once & column
+        once |= column
+    failed |= (once != full).any(axis=1)
+    # a position holding the only place left for a symbol in one of its
+    # units takes that symbol, and can't take two
+    forced = candidates & numpy.bitwise_or.reduce(
+        (once & ~twice)[:, cell_units], axis=2)
+    failed |= ((forced & (forced - 1)) != 0).any(axis=1)
+    candidates = numpy.where(forced != 0, forced, candidates)
+    failed |= (candidates == 0).any(axis=1)
+    return candidates, failed
+
+
+# units and units of each position, by n
+_unit_array_cache = {}
+
+
+def _unit_arrays(n):
+    """
+    Return an array of the positions in each row, column and subsquare
+    of an nxn SudokuPuzzle, one unit per row, and an array of the three
+    units each position is in, one position per row.
+
+    @type n: int
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    if n not in _unit_array_cache:
+        units, cell_units = [[] for _ in range(3 * n)], []
+        for i, unit in enumerate(zip(*_units(n))):
+            cell_units.append([kind * n + number
+                               for kind, number in enumerate(unit)])
+            for number in cell_units[-1]:
+                units[number].append(i)
+        _unit_array_cache[n] = (numpy.array(units), numpy.array(cell_units))
+    return _unit_array_cache[n]
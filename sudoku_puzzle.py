@@ -1,4 +1,12 @@
 from puzzle import Puzzle
+from puzzle_tools import Solver, SearchStats, build_path
+from dancing_links import ExactCover
+import random
+
+# difficulties of SudokuPuzzles with one solution, easiest first
+DIFFICULTIES = ("easy", "medium", "hard")
+# symbols of generated nxn SudokuPuzzles, for n up to 25
+SYMBOLS = "123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
 
 class SudokuPuzzle(Puzzle):
@@ -22,6 +30,10 @@ class SudokuPuzzle(Puzzle):
         assert len(symbol_set) == n
         assert len(symbols) == n ** 2
         self._n, self._symbols, self._symbol_set = n, symbols, symbol_set
+        # constraint bitmasks, computed when first needed
+        self._bits, self._choice = None, None
+        self._rows, self._columns, self._boxes = None, None, None
+        self._empty, self._conflict = None, None
 
     def __eq__(self, other):
         """
@@ -35,6 +47,17 @@ class SudokuPuzzle(Puzzle):
                 self._n == other._n and self._symbols == other._symbols and
                 self._symbol_set == other._symbol_set)
 
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return the symbols of SudokuPuzzle self as a tuple.
+
+        @type self: SudokuPuzzle
+        @rtype: tuple[str]
+        """
+        return tuple(self._symbols)
+
     def __str__(self):
         """
         Return a human-readable string representation of SudokuPuzzle self.
@@ -85,43 +108,125 @@ class SudokuPuzzle(Puzzle):
         @type self: SudokuPuzzle
         @rtype: bool
         """
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # no "*" left and all rows, column, subsquares have correct symbols
-        return ("*" not in symbols and
-                all([(self._row_set(i) == self._symbol_set and
-                      self._column_set(i) == self._symbol_set and
-                      self._subsquare_set(i) ==
-                      self._symbol_set) for i in range(n ** 2)]))
+        self._constrain()
+        # no "*" left and no symbol repeated in a row, column or subsquare
+        return self._empty == 0 and not self._conflict
 
     def extensions(self):
         """
-        Return list of extensions of SudokuPuzzle self.
+        Return list of extensions of SudokuPuzzle self, filling in the
+        empty position with the fewest allowed symbols.
 
         @type self: SudokuPuzzle
         @rtype: list[SudokuPuzzle]
         """
-        # convenient names
-        symbols, symbol_set, n = self._symbols, self._symbol_set, self._n
-        if "*" not in symbols:
-            # return an empty list
-            return [_ for _ in []]
-        else:
-            # position of first empty position
-            i = symbols.index("*")
-            # allowed symbols at position i
-            # A | B == A.union(B)
-            allowed_symbols = (self._symbol_set -
-                               (self._row_set(i) |
-                                self._column_set(i) |
-                                self._subsquare_set(i)))
-            # list of SudokuPuzzles with each legal digit at position i
-            return (
-                [SudokuPuzzle(n,
-                 symbols[:i] + [d] + symbols[i + 1:], symbol_set)
-                 for d in allowed_symbols])
-
-    
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of SudokuPuzzle self one at a time, each
+        board being copied only when it is asked for.
+
+        @type self: SudokuPuzzle
+        @rtype: generator[SudokuPuzzle]
+        """
+        choice = self._choose()
+        if choice is None:
+            return
+        i, allowed = choice
+        # a SudokuPuzzle with each legal symbol at position i
+        for d, bit in self._bits:
+            if allowed & bit:
+                yield self._extend(i, d, bit)
+
+    def move_to(self, extension):
+        """
+        Return the row, column and symbol of the position that
+        SudokuPuzzle self fills in to reach extension.
+
+        @type self: SudokuPuzzle
+        @type extension: SudokuPuzzle
+        @rtype: (int, int, str)
+        """
+        i = next(i for i, (a, b) in enumerate(zip(self._symbols,
+                                                   extension._symbols))
+                 if a != b)
+        return i // self._n, i % self._n, extension._symbols[i]
+
+    def moves(self):
+        """
+        Return the (row, column, symbol) fillings of the empty position
+        of SudokuPuzzle self with the fewest allowed symbols, as move_to
+        describes its extensions.
+
+        >>> SudokuPuzzle(4, list("123*" "****" "****" "****"),
+        ...              set("1234")).moves()
+        [(0, 3, '4')]
+
+        @type self: SudokuPuzzle
+        @rtype: list[(int, int, str)]
+        """
+        choice = self._choose()
+        if choice is None:
+            return []
+        i, allowed = choice
+        r, c = divmod(i, self._n)
+        return [(r, c, d) for d, bit in self._bits if allowed & bit]
+
+    def apply(self, move):
+        """
+        Fill in the (row, column, symbol) move of SudokuPuzzle self.
+
+        @type self: SudokuPuzzle
+        @type move: (int, int, str)
+        @rtype: None
+        """
+        self._constrain()
+        r, c, d = move
+        bit = self._bit(d)
+        i = r * self._n + c
+        self._symbols[i] = d
+        self._rows[r] |= bit
+        self._columns[c] |= bit
+        self._boxes[_units(self._n)[2][i]] |= bit
+        self._empty, self._choice = self._empty - 1, None
+
+    def undo(self, move):
+        """
+        Empty the position that the (row, column, symbol) move filled in
+        SudokuPuzzle self.
+
+        @type self: SudokuPuzzle
+        @type move: (int, int, str)
+        @rtype: None
+        """
+        r, c, d = move
+        # a legal move's symbol was in none of the three units before
+        bit = self._bit(d)
+        i = r * self._n + c
+        self._symbols[i] = "*"
+        self._rows[r] &= ~bit
+        self._columns[c] &= ~bit
+        self._boxes[_units(self._n)[2][i]] &= ~bit
+        self._empty, self._choice = self._empty + 1, None
+
+    def copy(self):
+        """
+        Return a copy of SudokuPuzzle self.
+
+        @type self: SudokuPuzzle
+        @rtype: SudokuPuzzle
+        """
+        self._constrain()
+        other = SudokuPuzzle.__new__(SudokuPuzzle)
+        other._n, other._symbol_set = self._n, self._symbol_set
+        other._symbols = self._symbols[:]
+        other._bits, other._choice = self._bits, self._choice
+        other._rows, other._columns = self._rows[:], self._columns[:]
+        other._boxes = self._boxes[:]
+        other._empty, other._conflict = self._empty, self._conflict
+        return other
+
     def fail_fast(self):
         """
         Return True iff SudokuPuzzle self can never be extended to a solution
@@ -129,70 +234,614 @@ class SudokuPuzzle(Puzzle):
         @type self: SudokuPuzzle
         @rtype: bool
         """
-        if '*' in self._symbols:
-            for i in range(self._n ** 2):
-                if self._symbols[i] == '*':
-                    symbols_used = set([])
-                    for row_char in self._row_set(i):
-                        if row_char != '*':
-                            symbols_used.add(row_char)
-                    for col_char in self._column_set(i):
-                        if col_char != '*':
-                            symbols_used.add(col_char)
-                    if symbols_used == self._symbol_set:
-                        return True
-        
-        return False
+        choice = self._choose()
+        return self._conflict or (choice is not None and choice[1] == 0)
+
+    def exact_cover_solutions(self, limit=None, check=None):
+        """
+        Yield each solution of SudokuPuzzle self as a list of
+        (position, symbol) pairs filling its empty positions, stopping
+        after limit solutions unless limit is None.  check is called as
+        by ExactCover.solutions.
+
+        Solutions are found with Dancing Links on the exact cover
+        problem whose columns are the constraints self has yet to meet:
+        each empty position filled, and each missing symbol placed once
+        in its row, column and subsquare.
+
+        @type self: SudokuPuzzle
+        @type limit: int | None
+        @type check: () -> Any | None
+        @rtype: generator[list[(int, str)]]
+        """
+        self._constrain()
+        if self._conflict:
+            return
+        n, symbols = self._n, self._symbols
+        rows_of, columns_of, boxes_of = _units(n)
+        # number every unmet constraint first, so a constraint that no
+        # placement meets still has an (empty) column
+        constraints = {}
+        for i in range(n ** 2):
+            if symbols[i] == "*":
+                constraints[(0, i)] = len(constraints)
+        for kind, masks in ((1, self._rows), (2, self._columns),
+                            (3, self._boxes)):
+            for unit in range(n):
+                for _, bit in self._bits:
+                    if not masks[unit] & bit:
+                        constraints[(kind, unit, bit)] = len(constraints)
+        placements, rows = [], []
+        for i in range(n ** 2):
+            if symbols[i] != "*":
+                continue
+            r, c, b = rows_of[i], columns_of[i], boxes_of[i]
+            used = self._rows[r] | self._columns[c] | self._boxes[b]
+            for d, bit in self._bits:
+                if not used & bit:
+                    placements.append((i, d))
+                    rows.append([constraints[(0, i)],
+                                 constraints[(1, r, bit)],
+                                 constraints[(2, c, bit)],
+                                 constraints[(3, b, bit)]])
+        for chosen in ExactCover(len(constraints), rows).solutions(limit,
+                                                                   check):
+            yield [placements[k] for k in chosen]
+
+    def count_solutions(self, limit=2, budget=None):
+        """
+        Return the number of solutions of SudokuPuzzle self, counting no
+        further than limit.  If budget is not None, raise BudgetExceeded
+        as soon as the count goes beyond it, with each branch counted as
+        an expansion.
+
+        The count is a backtracking search over the constraint bitmasks
+        of self, without building any puzzles along the way.  It fills
+        positions with one allowed symbol, then the only positions left
+        for a symbol in a unit, and only then branches on the empty
+        position with the fewest allowed symbols.
+
+        >>> grid = list("12**" "34**" "****" "****")
+        >>> SudokuPuzzle(4, grid, set("1234")).count_solutions(20)
+        12
+        >>> SudokuPuzzle(4, grid, set("1234")).count_solutions()
+        2
+
+        @type self: SudokuPuzzle
+        @type limit: int
+        @type budget: Budget | None
+        @rtype: int
+        """
+        self._constrain()
+        if self._conflict or limit <= 0:
+            return 0
+        check = None if budget is None else _checker(self, budget=budget)
+        n = self._n
+        rows, columns = self._rows[:], self._columns[:]
+        boxes = self._boxes[:]
+        rows_of, columns_of, boxes_of = _units(n)
+        empty = [(rows_of[i], columns_of[i], boxes_of[i])
+                 for i in range(n ** 2) if self._symbols[i] == "*"]
+        full = (1 << n) - 1
+        # bit counts are looked up for grids up to 16x16
+        ones = _ones(n) if n <= 16 else None
+        # empty[:depth] are filled; allowed[d] holds the symbols not yet
+        # tried at empty[d], and placed[d] the one there now
+        allowed, placed = [0] * len(empty), [0] * len(empty)
+        count, depth, forward = 0, 0, True
+        while True:
+            if forward and depth == len(empty):
+                count += 1
+                if count >= limit:
+                    return count
+                forward = False
+            elif forward:
+                best, best_count, best_bits = depth, n + 1, 0
+                for j in range(depth, len(empty)):
+                    r, c, b = empty[j]
+                    bits = full & ~(rows[r] | columns[c] | boxes[b])
+                    k = (ones[bits] if ones is not None else
+                         bin(bits).count("1"))
+                    if k < best_count:
+                        best, best_count, best_bits = j, k, bits
+                        if k <= 1:
+                            break
+                if best_count > 1:
+                    # rather than branch, place a symbol that has one
+                    # position left in a unit, if there is one
+                    forced = _hidden_single(empty, depth, rows, columns,
+                                            boxes, full)
+                    if forced is not None:
+                        best, best_bits = forced
+                        best_count = 1 if best_bits else 0
+                if best_count == 0:
+                    forward = False
+                else:
+                    if best_count > 1 and check is not None:
+                        check()
+                    empty[depth], empty[best] = empty[best], empty[depth]
+                    allowed[depth] = best_bits
+            if not forward:
+                # undo the symbol placed one level up
+                depth -= 1
+                if depth < 0:
+                    return count
+                r, c, b = empty[depth]
+                bit = placed[depth]
+                rows[r] ^= bit
+                columns[c] ^= bit
+                boxes[b] ^= bit
+            if allowed[depth]:
+                bit = allowed[depth] & -allowed[depth]
+                allowed[depth] ^= bit
+                placed[depth] = bit
+                r, c, b = empty[depth]
+                rows[r] |= bit
+                columns[c] |= bit
+                boxes[b] |= bit
+                depth, forward = depth + 1, True
+            else:
+                forward = False
+
+    def difficulty(self):
+        """
+        Return how hard SudokuPuzzle self is to solve by hand: "easy" if
+        filling in positions with one allowed symbol solves it, "medium"
+        if also filling in the only position left for a symbol in a row,
+        column or subsquare does, and "hard" otherwise.
+
+        Precondition: self has exactly one solution.
+
+        >>> grid = list("*234" "34*2" "2*43" "43*1")
+        >>> SudokuPuzzle(4, grid, set("1234")).difficulty()
+        'easy'
+
+        @type self: SudokuPuzzle
+        @rtype: str
+        """
+        for level, hidden in (("easy", False), ("medium", True)):
+            if self._solved_by_singles(hidden):
+                return level
+        return "hard"
 
     # some helper methods
-    def _row_set(self, m):
-        #
-        # Return set of symbols in row of SudokuPuzzle self's symbols
-        # where position m occurs.
+    def _constrain(self):
+        # Compute the bitmask of symbols used in each row, column and
+        # subsquare of SudokuPuzzle self, unless already known.  Symbol
+        # number k, in sorted order, is bit 1 << k.
         #
         # @type self: SudokuPuzzle
-        # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
+        # @rtype: None
+        if self._rows is not None:
+            return
         n, symbols = self._n, self._symbols
-        # first position in m's row
-        r = (m // n) * n
-        # set of elements from symbols[r] .. symbols[r+n-1]
-        return set([symbols[r + i] for i in range(n)])
-
-    def _column_set(self, m):
-        # Return set of symbols in column of SudokuPuzzle self's symbols
-        # where position m occurs.
+        self._bits = [(d, 1 << k)
+                      for k, d in enumerate(sorted(self._symbol_set))]
+        bit_of = dict(self._bits)
+        rows_of, columns_of, boxes_of = _units(n)
+        self._rows, self._columns, self._boxes = [0] * n, [0] * n, [0] * n
+        self._empty, self._conflict = 0, False
+        for i in range(n ** 2):
+            if symbols[i] == "*":
+                self._empty += 1
+                continue
+            bit = bit_of[symbols[i]]
+            r, c, b = rows_of[i], columns_of[i], boxes_of[i]
+            if (self._rows[r] | self._columns[c] | self._boxes[b]) & bit:
+                self._conflict = True
+            self._rows[r] |= bit
+            self._columns[c] |= bit
+            self._boxes[b] |= bit
+
+    def _choose(self):
+        # Return (position, allowed symbols bitmask) for an empty position
+        # of SudokuPuzzle self with the fewest allowed symbols, or None if
+        # there are no empty positions.
         #
         # @type self: SudokuPuzzle
-        # @type m: int
-        assert 0 <= m <= self._n ** 2
-        # convenient names
-        symbols, n = self._symbols, self._n
-        # first position in m's column
-        c = m % n
-        # set of elements from symbols[c], symbols[c + n],
-        # ... symbols[c + (n * (n-1))]
-        return set([symbols[c + (i * n)] for i in range(n)])
-
-    def _subsquare_set(self, m):
-        # Return set of symbols in subsquare of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @rtype: (int, int) | None
+        self._constrain()
+        if self._choice is None and self._empty > 0:
+            n, symbols = self._n, self._symbols
+            rows, columns, boxes = self._rows, self._columns, self._boxes
+            rows_of, columns_of, boxes_of = _units(n)
+            full, best = (1 << n) - 1, n + 1
+            for i in range(n ** 2):
+                if symbols[i] == "*":
+                    allowed = full & ~(rows[rows_of[i]] |
+                                       columns[columns_of[i]] |
+                                       boxes[boxes_of[i]])
+                    count = bin(allowed).count("1")
+                    if count < best:
+                        self._choice, best = (i, allowed), count
+                        if count <= 1:
+                            # no position can do better than forced
+                            break
+        return self._choice
+
+    def _bit(self, d):
+        # Return the bitmask of symbol d in SudokuPuzzle self.
         #
         # @type self: SudokuPuzzle
-        # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # row, column where m occur
-        row, col = m // n, m % n
-        # length of subsquares
+        # @type d: str
+        # @rtype: int
+        for symbol, bit in self._bits:
+            if symbol == d:
+                return bit
+
+    def _extend(self, i, d, bit):
+        # Return SudokuPuzzle self with symbol d, whose bitmask is bit,
+        # at empty position i.  The constraint bitmasks are carried over
+        # and updated rather than recomputed.
+        #
+        # @type self: SudokuPuzzle
+        # @type i: int
+        # @type d: str
+        # @type bit: int
+        # @rtype: SudokuPuzzle
+        n = self._n
+        rows_of, columns_of, boxes_of = _units(n)
+        child = SudokuPuzzle.__new__(SudokuPuzzle)
+        child._n, child._symbol_set = n, self._symbol_set
+        child._symbols = self._symbols[:i] + [d] + self._symbols[i + 1:]
+        child._bits, child._choice = self._bits, None
+        child._rows, child._columns = self._rows[:], self._columns[:]
+        child._boxes = self._boxes[:]
+        child._rows[rows_of[i]] |= bit
+        child._columns[columns_of[i]] |= bit
+        child._boxes[boxes_of[i]] |= bit
+        child._empty, child._conflict = self._empty - 1, self._conflict
+        return child
+
+    def _solved_by_singles(self, hidden):
+        # Return whether SudokuPuzzle self is solved by filling in, over
+        # and over, each empty position with one allowed symbol and, if
+        # hidden, each position that is the only one left for a symbol
+        # in one of its row, column and subsquare.
+        #
+        # @type self: SudokuPuzzle
+        # @type hidden: bool
+        # @rtype: bool
+        self._constrain()
+        if self._conflict:
+            return False
+        n = self._n
+        masks = (self._rows[:], self._columns[:], self._boxes[:])
+        units = _units(n)
+        full = (1 << n) - 1
+        empty = [i for i in range(n ** 2) if self._symbols[i] == "*"]
+        while empty:
+            allowed = {}
+            for i in empty:
+                allowed[i] = full & ~(masks[0][units[0][i]] |
+                                      masks[1][units[1][i]] |
+                                      masks[2][units[2][i]])
+                if not allowed[i]:
+                    return False
+            forced = {i: bits for i, bits in allowed.items()
+                      if not bits & (bits - 1)}
+            if not forced and hidden:
+                forced = _hidden_singles(allowed, units, masks, full)
+                if forced is None:
+                    return False
+            if not forced:
+                return False
+            for i, bit in forced.items():
+                for kind in range(3):
+                    if masks[kind][units[kind][i]] & bit:
+                        # two positions forced to one symbol
+                        return False
+                    masks[kind][units[kind][i]] |= bit
+            empty = [i for i in empty if i not in forced]
+        return True
+
+
+class DancingLinksSolver(Solver):
+    """
+    Exact cover search for SudokuPuzzles, fast enough for 16x16, 25x25
+    and 36x36 grids.
+    """
+
+    def search(self, puzzle, stats):
+        """
+        Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+        a solution, filling one empty position per step.  Return None if
+        this is not possible.
+
+        The exact cover search doesn't go through puzzles, so each
+        column it branches on is counted in stats as an expansion, and
+        checked against the budget of the solve.
+
+        @type self: DancingLinksSolver
+        @type puzzle: SudokuPuzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        check = _checker(puzzle, stats)
+        for placements in puzzle.exact_cover_solutions(1, check):
+            bit_of, path = dict(puzzle._bits), [puzzle]
+            for i, d in placements:
+                path.append(path[-1]._extend(i, d, bit_of[d]))
+            return build_path(path)
+        return None
+
+    def solved(self, puzzle):
+        """
+        Return a solved SudokuPuzzle extending puzzle, or None if there
+        isn't one.
+
+        @type self: DancingLinksSolver
+        @type puzzle: SudokuPuzzle
+        @rtype: SudokuPuzzle | None
+        """
+        for placements in puzzle.exact_cover_solutions(1):
+            symbols = puzzle._symbols[:]
+            for i, d in placements:
+                symbols[i] = d
+            return SudokuPuzzle(puzzle._n, symbols, puzzle._symbol_set)
+        return None
+
+    def count(self, puzzle, limit=None, budget=None):
+        """
+        Return the number of solutions of puzzle, counting no further
+        than limit unless limit is None.  If budget is not None, raise
+        BudgetExceeded as soon as the count goes beyond it.
+
+        @type self: DancingLinksSolver
+        @type puzzle: SudokuPuzzle
+        @type limit: int | None
+        @type budget: Budget | None
+        @rtype: int
+        """
+        check = None if budget is None else _checker(puzzle, budget=budget)
+        return sum([1 for _ in puzzle.exact_cover_solutions(limit, check)])
+
+
+def _checker(puzzle, stats=None, budget=None):
+    """
+    Return a function for a search of puzzle that doesn't go through
+    puzzles to call at each branch, counting it in stats as an
+    expansion of puzzle, and raising BudgetExceeded once the search is
+    beyond stats.budget.  If stats is None, a new SearchStats is used,
+    with budget started as its budget.
+
+    @type puzzle: SudokuPuzzle
+    @type stats: SearchStats | None
+    @type budget: Budget | None
+    @rtype: () -> None
+    """
+    if stats is None:
+        stats = SearchStats(timed=False)
+        stats.budget = budget
+        budget.start()
+
+    def check():
+        stats.expanded += 1
+        if stats.budget is not None:
+            stats.budget.check(stats, puzzle)
+
+    return check
+
+
+def dancing_links_solve(puzzle):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing a
+    solution, found with Dancing Links.  Return None if this is not
+    possible.
+
+    @type puzzle: SudokuPuzzle
+    @rtype: PuzzleNode | None
+    """
+    return DancingLinksSolver().solve(puzzle)
+
+
+def generate_sudoku(n=9, difficulty="hard", clues=0, symbol_set=None,
+                    rng=None, attempts=100):
+    """
+    Return a new nxn SudokuPuzzle of symbols from symbol_set, or from
+    the first n of SYMBOLS if symbol_set is None, with exactly one
+    solution and the given difficulty, one of DIFFICULTIES.
+
+    Clues are taken out of a random solved grid in random order for as
+    long as the puzzle keeps one solution, can still be solved at the
+    target difficulty and has more than clues clues.  A grid that ends
+    up easier than the target is thrown away for another, up to
+    attempts grids, after which ValueError is raised.  Randomness comes
+    from rng, or from a new random.Random() if rng is None.
+
+    @type n: int
+    @type difficulty: str
+    @type clues: int
+    @type symbol_set: set[str] | None
+    @type rng: random.Random | None
+    @type attempts: int
+    @rtype: SudokuPuzzle
+    """
+    assert difficulty in DIFFICULTIES
+    if symbol_set is None:
+        symbol_set = set(SYMBOLS[:n])
+    if rng is None:
+        rng = random.Random()
+    for _ in range(attempts):
+        symbols = _solved_grid(n, sorted(symbol_set), rng)
+        positions = list(range(n ** 2))
+        rng.shuffle(positions)
+        remaining = n ** 2
+        for i in positions:
+            if remaining <= clues:
+                break
+            symbol, symbols[i] = symbols[i], "*"
+            puzzle = SudokuPuzzle(n, symbols[:], symbol_set)
+            if difficulty == "hard":
+                # only the hard target needs counting: a puzzle solved
+                # by singles alone has one solution
+                keep = puzzle.count_solutions(2) == 1
+            else:
+                keep = puzzle._solved_by_singles(difficulty == "medium")
+            if keep:
+                remaining -= 1
+            else:
+                symbols[i] = symbol
+        puzzle = SudokuPuzzle(n, symbols, symbol_set)
+        if puzzle.difficulty() == difficulty:
+            return puzzle
+    raise ValueError("no {} {}x{} sudoku found in {} attempts".format(
+        difficulty, n, n, attempts))
+
+
+def _solved_grid(n, symbols, rng):
+    """
+    Return the symbols of a random solved nxn SudokuPuzzle using
+    symbols, found by shuffling the symbols, the rows within each band
+    and the bands, and the columns within each stack and the stacks, of
+    a fixed solved grid.
+
+    @type n: int
+    @type symbols: list[str]
+    @type rng: random.Random
+    @rtype: list[str]
+    """
+    ss = round(n ** (1 / 2))
+
+    def shuffled(items):
+        items = list(items)
+        rng.shuffle(items)
+        return items
+
+    rows = [band * ss + r for band in shuffled(range(ss))
+            for r in shuffled(range(ss))]
+    columns = [stack * ss + c for stack in shuffled(range(ss))
+               for c in shuffled(range(ss))]
+    symbols = shuffled(symbols)
+    return [symbols[(ss * (r % ss) + r // ss + c) % n]
+            for r in rows for c in columns]
+
+
+def _hidden_singles(allowed, units, masks, full):
+    """
+    Return a dict from each position of allowed that is the only one
+    left for a symbol in its row, column or subsquare to that symbol's
+    bit, or None if some symbol has no position left in some unit or
+    some position is the only one left for two symbols.
+
+    @type allowed: dict[int, int]
+    @type units: (list[int], list[int], list[int])
+    @type masks: (list[int], list[int], list[int])
+    @type full: int
+    @rtype: dict[int, int] | None
+    """
+    forced = {}
+    for kind in range(3):
+        # per unit, the symbols of one or more, and of two or more,
+        # empty positions
+        once, twice = {}, {}
+        for i, bits in allowed.items():
+            u = units[kind][i]
+            twice[u] = twice.get(u, 0) | (once.get(u, 0) & bits)
+            once[u] = once.get(u, 0) | bits
+        for u, bits in once.items():
+            if bits | masks[kind][u] != full:
+                return None
+        for i, bits in allowed.items():
+            u = units[kind][i]
+            bits &= once[u] & ~twice[u]
+            if bits:
+                if bits & (bits - 1) or forced.get(i, bits) != bits:
+                    return None
+                forced[i] = bits
+    return forced
+
+
+def _hidden_single(empty, depth, rows, columns, boxes, full):
+    """
+    Return (j, bit) for a position empty[j], from depth on, that is the
+    only one left for the symbol of bit in its row, column or subsquare,
+    or (depth, 0) if some symbol has no position left in some unit or
+    some position is the only one left for two symbols.  Return None if
+    there is no such position.  Each of empty is the (row, column,
+    subsquare) of a position, and rows, columns and boxes hold the
+    symbols used in each unit.
+
+    @type empty: list[(int, int, int)]
+    @type depth: int
+    @type rows: list[int]
+    @type columns: list[int]
+    @type boxes: list[int]
+    @type full: int
+    @rtype: (int, int) | None
+    """
+    n = len(rows)
+    # per unit, the symbols of one or more, and of two or more, empty
+    # positions, for rows, then columns, then boxes
+    once, twice = [0] * (3 * n), [0] * (3 * n)
+    cells = []
+    for j in range(depth, len(empty)):
+        r, c, b = empty[j]
+        bits = full & ~(rows[r] | columns[c] | boxes[b])
+        c, b = c + n, b + 2 * n
+        twice[r] |= once[r] & bits
+        once[r] |= bits
+        twice[c] |= once[c] & bits
+        once[c] |= bits
+        twice[b] |= once[b] & bits
+        once[b] |= bits
+        cells.append((j, r, c, b, bits))
+    used = rows + columns + boxes
+    for u in range(3 * n):
+        if once[u] | used[u] != full:
+            return depth, 0
+    for j, r, c, b, bits in cells:
+        bits &= ((once[r] & ~twice[r]) | (once[c] & ~twice[c]) |
+                 (once[b] & ~twice[b]))
+        if bits:
+            return j, (0 if bits & (bits - 1) else bits)
+    return None
+
+
+# number of bits set in each nxn SudokuPuzzle bitmask, by n
+_ones_cache = {}
+
+
+def _ones(n):
+    """
+    Return a list of the number of bits set in each number below 2 ** n.
+
+    >>> _ones(3)
+    [0, 1, 1, 2, 1, 2, 2, 3]
+
+    @type n: int
+    @rtype: list[int]
+    """
+    if n not in _ones_cache:
+        ones = [0]
+        for _ in range(n):
+            ones += [k + 1 for k in ones]
+        _ones_cache[n] = ones
+    return _ones_cache[n]
+
+
+# row, column and subsquare of each position, by n
+_unit_cache = {}
+
+
+def _units(n):
+    """
+    Return lists giving the row, column and subsquare number of each
+    position of an nxn SudokuPuzzle.
+
+    >>> [boxes[:6] for rows, columns, boxes in [_units(4)]]
+    [[0, 0, 1, 1, 0, 0]]
+
+    @type n: int
+    @rtype: (list[int], list[int], list[int])
+    """
+    if n not in _unit_cache:
         ss = round(n ** (1 / 2))
-        # upper-left position of m's subsquare
-        ul = (((row // ss) * ss) * n) + ((col // ss) * ss)
-        # return set of symbols from subsquare starting at ul
-        return set(
-            [symbols[ul + i + n * j] for i in range(ss) for j in range(ss)])
+        _unit_cache[n] = ([i // n for i in range(n ** 2)],
+                          [i % n for i in range(n ** 2)],
+                          [(i // n // ss) * ss + (i % n) // ss
+                           for i in range(n ** 2)])
+    return _unit_cache[n]
 
 
 if __name__ == "__main__":
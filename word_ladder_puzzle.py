@@ -1,4 +1,9 @@
 from puzzle import Puzzle
+from puzzle_tools import Solver, build_path
+from collections import deque, OrderedDict
+import json
+import mmap
+import os
 
 seen_words = set()
 
@@ -15,13 +20,18 @@ class WordLadderPuzzle(Puzzle):
 
         @type from_word: str
         @type to_word: str
-        @type ws: set[str]
+        @type ws: set[str] | WordDictionary
         @rtype: None
         """
         (self._from_word, self._to_word, self._word_set) = (from_word,
                                                             to_word, ws)
         # set of characters to use for 1-character changes
         self._chars = "abcdefghijklmnopqrstuvwxyz"
+        # True for a puzzle built by reversed, which steps backwards along
+        # moves of the original puzzle
+        self._backward = False
+        # WordIndex of ws, found when extensions are first needed
+        self._index = None
 
     def __str__(self):
         """
@@ -43,10 +53,36 @@ class WordLadderPuzzle(Puzzle):
         @type other: WordLadderPuzzle
         @rtype: bool
         """
+        # puzzles of one search share their word set, so the sets are
+        # compared by identity before falling back to comparing words
         return (self._from_word == other._from_word and
                 self._to_word == other._to_word and
-                self._word_set == other._word_set) 
+                (self._word_set is other._word_set or
+                 self._word_set == other._word_set))
     
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return the current word of WordLadderPuzzle self.
+
+        @type self: WordLadderPuzzle
+        @rtype: str
+        """
+        return self._from_word
+
+    def __getstate__(self):
+        """
+        Return the attributes of WordLadderPuzzle self to pickle, leaving
+        out its WordIndex, which is rebuilt when next needed.
+
+        @type self: WordLadderPuzzle
+        @rtype: dict
+        """
+        state = self.__dict__.copy()
+        state["_index"] = None
+        return state
+
     def __repr__(self):
             """
             Return a human-readable string representation of WordLadderPuzzle 
@@ -60,6 +96,30 @@ class WordLadderPuzzle(Puzzle):
             return "from_word: '{}' \nto_word: '{}' \nword_set: '{}'".format(
                 self._from_word, self._to_word, self._word_set)   
     
+    def reversed(self):
+        """
+        Return a WordLadderPuzzle from _to_word to _from_word over the same
+        words.  Its extensions only change characters from _chars, since a
+        move onto any other character could not be made forwards, but may
+        change them to any character, as a forward move may start from
+        one outside _chars.
+
+        >>> from puzzle_tools import breadth_first_solve, bidirectional_solve
+        >>> ws = {"Xaa", "Xab", "Xad", "Xae", "Xac", "cac"}
+        >>> p = WordLadderPuzzle("Xaa", "cac", ws)
+        >>> bidirectional_solve(p) == breadth_first_solve(p)
+        True
+        >>> print(bidirectional_solve(WordLadderPuzzle("Xaa", "Xax", ws)))
+        None
+
+        @type self: WordLadderPuzzle
+        @rtype: WordLadderPuzzle
+        """
+        puzzle = WordLadderPuzzle(self._to_word, self._from_word,
+                                  self._word_set)
+        puzzle._backward = True
+        return puzzle
+
     # this WordLadderPuzzle is solved when _from_word is the same as
     # _to_word  
     
@@ -76,6 +136,23 @@ class WordLadderPuzzle(Puzzle):
                                                        self._to_word in
                                                        self._word_set)        
      
+    def fail_fast(self):
+        """
+        Return whether WordLadderPuzzle self can't be solved because the
+        word it leads to isn't in its word set: _to_word, or _from_word
+        for a puzzle built by reversed, which starts from the word the
+        original leads to.
+
+        >>> WordLadderPuzzle("cost", "cosx", {"cost", "cast"}).fail_fast()
+        True
+
+        @type self: WordLadderPuzzle
+        @rtype: bool
+        """
+        if self._backward:
+            return self._from_word not in self._word_set
+        return self._to_word not in self._word_set
+
     # legal extensions are WordLadderPuzzles that have a from_word that can
     # be reached from this one by changing a single letter to one of those
     # in self._chars
@@ -87,43 +164,602 @@ class WordLadderPuzzle(Puzzle):
         @type self: WordLadderPuzzle
         @rtype: list[WordLadderPuzzle]
         """
-        lst_ext = []
-        seen_words = set()
-        seen_words.add(self._from_word)
-        if not self.is_solved():
-            for i in range(len(self._from_word)):
-                for ch in self._chars:
-                    if i == 0:
-                        new_from_word = str(ch).lower() + self._from_word[1:]
-                        if new_from_word in self._word_set and new_from_word\
-                           != self._from_word and new_from_word not in\
-                           seen_words:
-                            temp = WordLadderPuzzle(new_from_word,
-                                                    self._to_word,
-                                                    self._word_set)
-                            lst_ext.append(temp)
-                            seen_words.add(new_from_word)
-                    else:
-                        new_from_word = self._from_word[:i] + str(ch).lower()\
-                            + self._from_word[i+1:]
-                        if new_from_word in self._word_set and new_from_word\
-                           != self._from_word and new_from_word not in\
-                           seen_words:
-                            temp = WordLadderPuzzle(new_from_word,
-                                                    self._to_word,
-                                                    self._word_set)
-                            lst_ext.append(temp)
-                            seen_words.add(new_from_word)
-
-        return lst_ext
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of WordLadderPuzzle self one word at a time.
+
+        @type self: WordLadderPuzzle
+        @rtype: generator[WordLadderPuzzle]
+        """
+        index = self._word_index()
+        for _, new_from_word in self.moves():
+            temp = WordLadderPuzzle(new_from_word, self._to_word,
+                                    self._word_set)
+            temp._backward, temp._index = self._backward, index
+            yield temp
+
+    def move_to(self, extension):
+        """
+        Return the word WordLadderPuzzle self changes to in extension.
+
+        @type self: WordLadderPuzzle
+        @type extension: WordLadderPuzzle
+        @rtype: str
+        """
+        return extension._from_word
+
+    def moves(self):
+        """
+        Return the steps that can be taken from WordLadderPuzzle self,
+        each as the pair of the current word and the word stepped to.
+
+        @type self: WordLadderPuzzle
+        @rtype: list[(str, str)]
+        """
+        if self.is_solved():
+            return []
+        word = self._from_word
+        if self._backward:
+            positions = [i for i in range(len(word))
+                         if word[i] in self._chars]
+        else:
+            positions = range(len(word))
+        return [(word, other) for other in self._word_index().neighbours(
+            word, positions, self._backward)]
+
+    def apply(self, move):
+        """
+        Take the step move from WordLadderPuzzle self.
+
+        @type self: WordLadderPuzzle
+        @type move: (str, str)
+        @rtype: None
+        """
+        self._from_word = move[1]
+
+    def undo(self, move):
+        """
+        Take back the step move from WordLadderPuzzle self.
+
+        @type self: WordLadderPuzzle
+        @type move: (str, str)
+        @rtype: None
+        """
+        self._from_word = move[0]
+
+    def copy(self):
+        """
+        Return a copy of WordLadderPuzzle self, sharing its word set.
+
+        @type self: WordLadderPuzzle
+        @rtype: WordLadderPuzzle
+        """
+        other = WordLadderPuzzle(self._from_word, self._to_word,
+                                 self._word_set)
+        other._chars, other._backward = self._chars, self._backward
+        other._index = self._index
+        return other
+
+    def _word_index(self):
+        # Return the WordIndex of self._word_set, shared by every puzzle
+        # that extends this one.
+        #
+        # @type self: WordLadderPuzzle
+        # @rtype: WordIndex
+        if self._index is None:
+            self._index = word_index(self._word_set, self._chars)
+        return self._index
+
+
+class WordIndex:
+    """
+    The words of a word set bucketed by length, then by position, then
+    by the word with the character at that position left out, so that
+    all words one change away from a word are found with one dictionary
+    lookup per position.
+
+    Forward buckets only hold words with a character of chars at the
+    position, the ones a change can lead to; backward buckets hold every
+    word, since a change may start from any character.
+    """
+
+    def __init__(self, ws, chars):
+        """
+        Create a new WordIndex self of the words in ws, where a word is
+        only a neighbour of others through positions holding a character
+        of chars.  Buckets for each word length are built when first
+        needed.
+
+        @type self: WordIndex
+        @type ws: set[str]
+        @type chars: str
+        @rtype: None
+        """
+        self._word_set, self._chars = ws, chars
+        # (length, backward) -> buckets
+        self._buckets = {}
+
+    def neighbours(self, word, positions, backward=False):
+        """
+        Return the words of WordIndex self that differ from word only at
+        one of positions, and have a character of chars there, or any
+        character there if backward.
+
+        >>> index = WordIndex({"cost", "cast", "most", "cysts"}, "aos")
+        >>> sorted(index.neighbours("cost", range(4)))
+        ['cast']
+        >>> index = WordIndex({"cost", "cast", "cyst"}, "aos")
+        >>> sorted(index.neighbours("cost", [1]))
+        ['cast']
+        >>> sorted(index.neighbours("cost", [1], True))
+        ['cast', 'cyst']
+
+        @type self: WordIndex
+        @type word: str
+        @type positions: iterable[int]
+        @type backward: bool
+        @rtype: list[str]
+        """
+        buckets = self._buckets.get((len(word), backward))
+        if buckets is None:
+            buckets = self._buckets[len(word), backward] = self._build(
+                len(word), backward)
+        result = []
+        for i in positions:
+            for other in buckets[i].get(word[:i] + word[i + 1:], ()):
+                if other != word:
+                    result.append(other)
+        return result
+
+    def _build(self, length, backward):
+        # Return one dict per position of words of length length, from
+        # each word with that position left out to the sorted words
+        # that have a character of chars there, or to all of them if
+        # backward.
+        #
+        # @type self: WordIndex
+        # @type length: int
+        # @type backward: bool
+        # @rtype: list[dict[str, tuple[str]]]
+        buckets = [{} for _ in range(length)]
+        if isinstance(self._word_set, WordDictionary):
+            words = self._word_set.words(length)
+        else:
+            words = sorted([w for w in self._word_set if len(w) == length])
+        for word in words:
+            for i in range(length):
+                if backward or word[i] in self._chars:
+                    buckets[i].setdefault(word[:i] + word[i + 1:],
+                                          []).append(word)
+        return [{key: tuple(words) for key, words in bucket.items()}
+                for bucket in buckets]
+
+
+# the last index built, reused while puzzles keep the same word set
+_last_index = None
+
+
+def word_index(ws, chars):
+    """
+    Return a WordIndex of ws for changes to characters of chars, reusing
+    the last one built if it was for the very same ws and chars.
+
+    @type ws: set[str] | WordDictionary
+    @type chars: str
+    @rtype: WordIndex
+    """
+    global _last_index
+    index = _last_index
+    if index is None or index._word_set is not ws or index._chars != chars:
+        index = _last_index = WordIndex(ws, chars)
+    return index
+
+
+_MAGIC = b"WORDS1\n"
+
+
+class WordDictionary:
+    """
+    A read-only set of words, compiled into a file of sorted words
+    bucketed by length and mapped from it, so that only the buckets a
+    search asks for are ever read.
+
+    A WordDictionary is meant to be loaded once and shared: it compares
+    equal only to itself, and load_word_dictionary returns the same one
+    for the same file.
+    """
+
+    def __init__(self, path, buffer, lengths):
+        """
+        Create a new WordDictionary self over buffer, the mapping of the
+        file at path, where lengths maps each word length to the offset,
+        size and count of the bucket of words of that length.
+
+        @type self: WordDictionary
+        @type path: str
+        @type buffer: mmap.mmap
+        @type lengths: dict[int, list[int]]
+        @rtype: None
+        """
+        self.path, self._buffer, self._lengths = path, buffer, lengths
+        # word length -> sorted words and frozenset of them, decoded from
+        # buffer when first needed
+        self._words, self._sets = {}, {}
+
+    def __contains__(self, word):
+        """
+        Return whether word is in WordDictionary self.
+
+        @type self: WordDictionary
+        @type word: str
+        @rtype: bool
+        """
+        words = self._sets.get(len(word))
+        if words is None:
+            words = self._sets[len(word)] = frozenset(self.words(len(word)))
+        return word in words
+
+    def __iter__(self):
+        """
+        Yield the words of WordDictionary self, shortest first.
+
+        @type self: WordDictionary
+        @rtype: generator[str]
+        """
+        for length in sorted(self._lengths):
+            yield from self.words(length)
+
+    def __len__(self):
+        """
+        Return the number of words in WordDictionary self.
+
+        @type self: WordDictionary
+        @rtype: int
+        """
+        return sum([count for _, _, count in self._lengths.values()])
+
+    def __repr__(self):
+        """
+        Return a string representation of WordDictionary self.
+
+        @type self: WordDictionary
+        @rtype: str
+        """
+        return "WordDictionary({!r})".format(self.path)
+
+    def __reduce__(self):
+        """
+        Return how to pickle WordDictionary self: by the path it is
+        loaded from, so that an unpickled one is loaded again, once per
+        process.
+
+        @type self: WordDictionary
+        @rtype: tuple
+        """
+        return load_word_dictionary, (self.path,)
+
+    def words(self, length):
+        """
+        Return the words of WordDictionary self of length length, in
+        sorted order.
+
+        @type self: WordDictionary
+        @type length: int
+        @rtype: tuple[str]
+        """
+        words = self._words.get(length)
+        if words is None:
+            if length not in self._lengths:
+                words = ()
+            else:
+                offset, size, _ = self._lengths[length]
+                words = tuple(self._buffer[offset:offset + size].decode(
+                    "utf-8").split("\n"))
+            self._words[length] = words
+        return words
+
+
+def compile_word_dictionary(ws, path):
+    """
+    Write the words of ws to the file at path as a WordDictionary.
+
+    @type ws: iterable[str]
+    @type path: str
+    @rtype: None
+    """
+    buckets = {}
+    for word in set(ws):
+        buckets.setdefault(len(word), []).append(word)
+    blocks = [(length, "\n".join(sorted(buckets[length])).encode("utf-8"))
+              for length in sorted(buckets)]
+    # the header holds offsets from the end of the header line, so that
+    # it can be written before they are known in the file
+    lengths, offset = {}, 0
+    for length, block in blocks:
+        lengths[length] = [offset, len(block), len(buckets[length])]
+        offset += len(block)
+    with open(path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(json.dumps({"lengths": lengths}).encode("utf-8") + b"\n")
+        for _, block in blocks:
+            f.write(block)
+
+
+# path -> WordDictionary, so that each file is mapped once per process
+_dictionaries = {}
+
+
+def load_word_dictionary(path):
+    """
+    Return the WordDictionary compiled to the file at path, mapped
+    read-only from the file, reusing the one already loaded from path
+    if there is one.
+
+    @type path: str
+    @rtype: WordDictionary
+    """
+    path = os.path.abspath(path)
+    dictionary = _dictionaries.get(path)
+    if dictionary is not None:
+        return dictionary
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(_MAGIC)] != _MAGIC:
+        buffer.close()
+        raise ValueError("{} is not a word dictionary".format(path))
+    end = buffer.find(b"\n", len(_MAGIC))
+    header = json.loads(buffer[len(_MAGIC):end].decode("utf-8"))
+    lengths = {int(length): [offset + end + 1, size, count]
+               for length, (offset, size, count)
+               in header["lengths"].items()}
+    dictionary = _dictionaries[path] = WordDictionary(path, buffer, lengths)
+    return dictionary
+
+
+def open_word_dictionary(source, path=None):
+    """
+    Return the WordDictionary of the words, one or more per line, in the
+    text file at source, compiling them to the file at path first, or
+    to source with ".dict" added if path is None, unless that file is
+    newer than source.
+
+    @type source: str
+    @type path: str | None
+    @rtype: WordDictionary
+    """
+    if path is None:
+        path = source + ".dict"
+    if (not os.path.exists(path) or
+            os.path.getmtime(path) < os.path.getmtime(source)):
+        with open(source, "r", encoding="UTF-8") as f:
+            ws = f.read().split()
+        # write under a temporary name so a concurrent loader never
+        # maps a half-written file
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        compile_word_dictionary(ws, temporary)
+        os.replace(temporary, path)
+        _dictionaries.pop(os.path.abspath(path), None)
+    return load_word_dictionary(path)
+
+
+class LadderTree:
+    """
+    The shortest ladders between one word and every word reachable from
+    it, found by one breadth-first search.
+
+    A forward tree holds ladders from its root; a backward tree holds
+    ladders to its root, following the moves of a reversed puzzle.
+    """
+
+    def __init__(self, index, root, backward=False, stats=None, to_word=None):
+        """
+        Create a new LadderTree self over the words of WordIndex index,
+        rooted at root.  If stats is not None, count the words expanded
+        in it as WordLadderPuzzles towards to_word.
+
+        @type self: LadderTree
+        @type index: WordIndex
+        @type root: str
+        @type backward: bool
+        @type stats: SearchStats | None
+        @type to_word: str | None
+        @rtype: None
+        """
+        self.index, self.root, self.backward = index, root, backward
+        # parent[w] is the word after w on a shortest ladder towards
+        # root, and distance[w] the number of changes between them
+        self.parent, self.distance = {root: None}, {root: 0}
+        frontier = deque([root])
+        chars = index._chars
+        while frontier:
+            word = frontier.popleft()
+            if stats is not None:
+                expanded = WordLadderPuzzle(word, to_word, index._word_set)
+                stats.expand(expanded, len(frontier) + 1, len(self.parent),
+                             depth=self.distance[word])
+            if backward:
+                positions = [i for i in range(len(word))
+                             if word[i] in chars]
+            else:
+                positions = range(len(word))
+            depth = self.distance[word] + 1
+            for other in index.neighbours(word, positions, backward):
+                if stats is not None:
+                    stats.generated += 1
+                if other in self.parent:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                self.parent[other], self.distance[other] = word, depth
+                frontier.append(other)
+
+    def ladder(self, word):
+        """
+        Return the words of a shortest ladder between word and the root
+        of LadderTree self, in the order they are stepped through, or
+        None if there isn't one.
+
+        >>> index = WordIndex({"cost", "cast", "case", "cave"}, "aeostv")
+        >>> LadderTree(index, "cost").ladder("cave")
+        ['cost', 'cast', 'case', 'cave']
+        >>> LadderTree(index, "cave", True).ladder("cost")
+        ['cost', 'cast', 'case', 'cave']
+
+        @type self: LadderTree
+        @type word: str
+        @rtype: list[str] | None
+        """
+        if word not in self.parent:
+            return None
+        words = [word]
+        while self.parent[words[-1]] is not None:
+            words.append(self.parent[words[-1]])
+        if not self.backward:
+            words.reverse()
+        return words
+
+
+class LadderTreeSolver(Solver):
+    """
+    Shortest word ladders read off cached LadderTrees, so that repeated
+    queries from, or to, the same word cost only the length of the
+    ladder.  A tree is rooted at the from word of a query, unless its
+    to word was the to word of a recent query too, in which case a
+    backward tree rooted at the to word serves both.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        Create a new LadderTreeSolver self that keeps the capacity most
+        recently used LadderTrees, and remembers as many recent to words.
+
+        @type self: LadderTreeSolver
+        @type capacity: int
+        @rtype: None
+        """
+        assert capacity > 0
+        self.capacity = capacity
+        # (root, backward, chars) -> LadderTree, least recently used
+        # first
+        self._trees = OrderedDict()
+        # (to word, chars) of recent queries, least recently used first
+        self._targets = OrderedDict()
+
+    def search(self, puzzle, stats):
+        """
+        Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+        containing a solution, read off a LadderTree rooted at the from
+        word or the to word of puzzle.  Return None if this is not
+        possible.
+
+        @type self: LadderTreeSolver
+        @type puzzle: WordLadderPuzzle
+        @type stats: SearchStats
+        @rtype: PuzzleNode | None
+        """
+        index = puzzle._word_index()
+        if puzzle._backward:
+            # a reversed puzzle steps back along a forward ladder
+            words = self._ladder(index, puzzle._to_word, puzzle._from_word,
+                                 stats)
+            if words is not None:
+                words.reverse()
+        else:
+            words = self._ladder(index, puzzle._from_word, puzzle._to_word,
+                                 stats)
+        if words is None:
+            return None
+        path = []
+        for word in words:
+            step = WordLadderPuzzle(word, puzzle._to_word, puzzle._word_set)
+            step._index = index
+            path.append(step)
+        path[0] = puzzle
+        return build_path(path) if path[-1].is_solved() else None
+
+    def _ladder(self, index, from_word, to_word, stats):
+        # Return the words of a shortest forward ladder from from_word to
+        # to_word over index, or None if there isn't one, using a cached
+        # LadderTree rooted at either word, or else building one, with
+        # its work counted in stats: rooted at to_word if it was a
+        # recent to word already, and otherwise at from_word.
+        #
+        # @type self: LadderTreeSolver
+        # @type index: WordIndex
+        # @type from_word: str
+        # @type to_word: str
+        # @type stats: SearchStats
+        # @rtype: list[str] | None
+        target = (to_word, index._chars)
+        repeated = target in self._targets
+        self._targets[target] = None
+        self._targets.move_to_end(target)
+        if len(self._targets) > self.capacity:
+            self._targets.popitem(last=False)
+        tree = self._tree(index, to_word, True)
+        if tree is not None:
+            return tree.ladder(from_word)
+        tree = self._tree(index, from_word, False)
+        if tree is not None:
+            return tree.ladder(to_word)
+        if repeated:
+            return self._tree(index, to_word, True, stats, to_word).ladder(
+                from_word)
+        return self._tree(index, from_word, False, stats, to_word).ladder(
+            to_word)
+
+    def _tree(self, index, root, backward, stats=None, to_word=None):
+        # Return the cached LadderTree of index rooted at root in
+        # direction backward.  If it isn't cached, return None when stats
+        # is None, and otherwise build it with its work counted in stats
+        # towards to_word.
+        #
+        # @type self: LadderTreeSolver
+        # @type index: WordIndex
+        # @type root: str
+        # @type backward: bool
+        # @type stats: SearchStats | None
+        # @type to_word: str | None
+        # @rtype: LadderTree | None
+        key = (root, backward, index._chars)
+        tree = self._trees.get(key)
+        if tree is not None and tree.index is index:
+            self._trees.move_to_end(key)
+            return tree
+        if stats is None:
+            return None
+        tree = self._trees[key] = LadderTree(index, root, backward, stats,
+                                             to_word)
+        self._trees.move_to_end(key)
+        if len(self._trees) > self.capacity:
+            self._trees.popitem(last=False)
+        return tree
+
+
+# the solver behind ladder_tree_solve, whose trees outlive each call
+_ladder_tree_solver = LadderTreeSolver()
+
+
+def ladder_tree_solve(puzzle):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+    a solution, with the fewest steps, reusing the LadderTrees of
+    earlier calls.  Return None if there is no such path.
+
+    @type puzzle: WordLadderPuzzle
+    @rtype: PuzzleNode | None
+    """
+    return _ladder_tree_solver.solve(puzzle)
+
 
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
     from puzzle_tools import breadth_first_solve, depth_first_solve
     from time import time
-    with open("words", "r", encoding = 'UTF-8') as words:
-        word_set = set(words.read().split())
+    word_set = open_word_dictionary("words")
     w = WordLadderPuzzle("same", "cost", word_set)
     start = time()
     sol = breadth_first_solve(w)